@@ -85,6 +85,31 @@ async def cleanup_expired_logs(services=Depends(get_services)):
         logger.error(f"Failed to cleanup logs: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/logs/stats/rebuild")
+async def rebuild_daily_stats(
+    days: int = Query(30, ge=1, le=365, description="Number of days to rebuild"),
+    services=Depends(get_services)
+):
+    """Recompute daily query statistics from the stored query logs"""
+    
+    try:
+        query_logger = services.get("query_logger")
+        
+        if not query_logger:
+            raise HTTPException(status_code=503, detail="Query logger service not available")
+        
+        rebuilt_days = await query_logger.rebuild_daily_stats(days=days)
+        
+        return {
+            "status": "success",
+            "days_rebuilt": rebuilt_days,
+            "message": f"Daily stats rebuilt for {rebuilt_days} days"
+        }
+        
+    except Exception as e:
+        logger.error(f"Failed to rebuild daily stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/logs/session/{session_id}")
 async def get_session_data(
     session_id: str,
@@ -230,6 +255,7 @@ async def check_logging_health(services=Depends(get_services)):
             "gdpr_compliance": query_logger.config.gdpr_compliance_mode,
             "db_accessible": True,
             "recent_queries": len(stats),
+            "dropped_logs": query_logger.dropped_logs,
             "message": "Logging system is operational"
         }
         
@@ -4,7 +4,11 @@ Chat Streaming API endpoints
 
 from fastapi import APIRouter, HTTPException, Depends, Request, BackgroundTasks, Header
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
 from models import ChatStreamRequest, StreamChunk
+from logging_models.logging_models import QueryLogData, ResponseLogData
+from services.llm import LLM_CONTEXT_CHARS
+import asyncio
 import logging
 import time
 import json
@@ -51,7 +55,7 @@ async def get_user_preferences(request: Request, authorization: Optional[str] =
         # For now, all preferences are session-based until we integrate Clerk user IDs
         session_id = get_session_id(request, chat_request)
         logger.info(f"🔍 [CHAT_PREFS] Getting session preferences for session: {session_id}")
-        prefs = preference_service.get_session_preferences(session_id)
+        prefs = await asyncio.to_thread(preference_service.get_session_preferences, session_id)
         logger.info(f"🔍 [CHAT_PREFS] Retrieved session preferences: {prefs}")
         return prefs
         
@@ -90,7 +94,7 @@ async def chat_stream_endpoint(
         print(f"🔍 [STREAM] Authorization header passed: {'Present' if authorization else 'None'}")
         
         # Log query if logging is enabled (use same session ID for consistency)
-        if query_logger and query_logger.config.enabled:
+        if query_logger and query_logger.enabled:
             session_id = await log_query_stream(query_logger, request, http_request)
         else:
             # Ensure we have a session ID even when logging is disabled
@@ -103,10 +107,10 @@ async def chat_stream_endpoint(
         followup_questions = []  # Followup questions feature removed in simplified version
         
         # Process streaming query
-        def generate_stream():
+        async def generate_stream():
             try:
                 # Process query using the same logic as regular chat  
-                yield from process_query_stream(
+                async for chunk in process_query_stream(
                     question=request.message,
                     query_mode=request.query_mode,
                     card_filter=request.card_filter,
@@ -122,7 +126,8 @@ async def chat_stream_endpoint(
                     user_preferences=user_preferences,
                     pre_enhanced_query=enhanced_search_query,
                     pre_metadata=initial_metadata
-                )
+                ):
+                    yield chunk
             except Exception as e:
                 logger.error(f"Stream generation error: {str(e)}", exc_info=True)
                 error_chunk = StreamChunk(
@@ -134,7 +139,7 @@ async def chat_stream_endpoint(
         
         # Add background task to log response after streaming completes
         if query_logger and session_id:
-            background_tasks.add_task(log_streaming_response, query_logger, session_id, start_time)
+            background_tasks.add_task(log_streaming_response, query_logger, session_id, start_time, request)
         
         return StreamingResponse(
             generate_stream(), 
@@ -150,7 +155,7 @@ async def chat_stream_endpoint(
         logger.error(f"Chat stream endpoint error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-def process_query_stream(
+async def process_query_stream(
     question: str,
     query_mode: str,
     card_filter: str,
@@ -167,7 +172,7 @@ def process_query_stream(
     pre_enhanced_query: str = None,
     pre_metadata: dict = None
 ):
-    """Process streaming user query"""
+    """Process streaming user query (search awaits the async Vertex client; LLM streaming runs in the threadpool)"""
     
     try:
         logger.info(f"Starting stream processing for: {question}")
@@ -194,10 +199,13 @@ def process_query_stream(
         elif metadata.get('card_detected'):
             search_card_filter = metadata['card_detected']
         
-        # For comparison queries, remove card filter to get comprehensive results
+        # For comparison queries, remove card filter to get comprehensive results; when the
+        # query names several cards, each gets its own filtered search instead (run concurrently)
+        comparison_cards = []
         if metadata.get('is_comparison') or metadata.get('direct_comparison'):
             search_card_filter = None  # Search all cards for comparison
-            logger.info(f"Detected comparison query - removing card filter for comprehensive search")
+            comparison_cards = retriever_service.cards_mentioned(question)
+            logger.info(f"Detected comparison query - removing card filter for comprehensive search, cards: {comparison_cards}")
         
         # Use the enhanced query from query enhancer directly
         final_search_query = enhanced_search_query
@@ -215,12 +223,20 @@ def process_query_stream(
         logger.info(f"Searching documents with FINAL query: {final_search_query}")
         logger.info(f"Original query was: {question}")
         logger.info(f"QueryEnhancer output was: {enhanced_search_query}")
-        relevant_docs = retriever_service.search_similar_documents(
-            query_text=final_search_query,
-            top_k=search_top_k,
-            card_filter=search_card_filter,
-            use_mmr=True
-        )
+        if len(comparison_cards) > 1:
+            per_card_docs = await retriever_service.search_cards(
+                final_search_query, comparison_cards, top_k=search_top_k,
+                max_content_chars=LLM_CONTEXT_CHARS
+            )
+            relevant_docs = interleave_card_results(per_card_docs, search_top_k)
+        else:
+            relevant_docs = await retriever_service.asearch_similar_documents(
+                query_text=final_search_query,
+                top_k=search_top_k,
+                card_filter=search_card_filter,
+                use_mmr=True,
+                max_content_chars=LLM_CONTEXT_CHARS
+            )
         logger.info(f"Found {len(relevant_docs)} relevant documents")
         
         # Smart model selection for complex calculations
@@ -252,13 +268,14 @@ def process_query_stream(
         logger.info(f"🎯 [LLM_CONTEXT] User preferences: {user_preferences}")
         logger.info(f"🎯 [LLM_CONTEXT] User preferences will be integrated into LLM system prompt for personalization")
         
-        for chunk_text, is_final, usage_info in llm_service.generate_answer_stream(
+        # The Gemini SDK stream is blocking; iterate it off the event loop
+        async for chunk_text, is_final, usage_info in iterate_in_threadpool(llm_service.generate_answer_stream(
             question=question,  # Use original question, not search query
             context_documents=relevant_docs,
             card_name=card_context,
             model_choice=model_to_use,
             user_preferences=user_preferences
-        ):
+        )):
             logger.debug(f"Received chunk: is_final={is_final}, text_length={len(chunk_text) if chunk_text else 0}")
             if is_final:
                 # Final chunk with complete information
@@ -353,10 +370,6 @@ def process_query_stream(
 async def log_query_stream(query_logger, request: ChatStreamRequest, http_request: Request) -> str:
     """Log the incoming streaming query"""
     try:
-        import sys
-        sys.path.append('..')
-        from logging_models.logging_models import QueryLogData
-        
         # Extract user context
         user_ip = get_client_ip(http_request)
         user_agent = http_request.headers.get("user-agent", "")
@@ -379,14 +392,16 @@ async def log_query_stream(query_logger, request: ChatStreamRequest, http_reques
         logger.error(f"Failed to log streaming query: {e}")
         return "unknown-session"
 
-async def log_streaming_response(query_logger, session_id: str, start_time: float):
+async def log_streaming_response(query_logger, session_id: str, start_time: float, request: ChatStreamRequest = None):
     """Background task to log streaming response after completion"""
-    import asyncio
-    import time as time_module
-    
     # Wait a bit for the stream to complete and store response data
     await asyncio.sleep(2)
     
+    # Logging disabled: the stored response data only needs cleaning up
+    if not query_logger.enabled:
+        streaming_responses.pop(session_id, None)
+        return
+    
     try:
         # Get stored response data
         response_data = streaming_responses.get(session_id)
@@ -395,12 +410,7 @@ async def log_streaming_response(query_logger, session_id: str, start_time: floa
             return
         
         # Calculate execution time
-        execution_time_ms = int((time_module.time() - start_time) * 1000)
-        
-        # Import required models
-        import sys
-        sys.path.append('..')
-        from logging_models.logging_models import ResponseLogData
+        execution_time_ms = int((time.time() - start_time) * 1000)
         
         llm_usage = response_data.get("llm_usage", {})
         
@@ -409,7 +419,10 @@ async def log_streaming_response(query_logger, session_id: str, start_time: floa
             execution_time_ms=execution_time_ms,
             llm_tokens_used=llm_usage.get("tokens", llm_usage.get("total_tokens", 0)),
             llm_cost=llm_usage.get("cost", 0.0),
-            search_results_count=len(response_data.get("documents", []))
+            search_results_count=len(response_data.get("documents", [])),
+            selected_model=request.model if request else None,
+            query_mode=request.query_mode if request else None,
+            is_comparison=query_logger.is_comparison_query(request.message) if request else None
         )
         
         await query_logger.log_response(session_id, log_data)
@@ -426,12 +439,10 @@ async def log_streaming_response(query_logger, session_id: str, start_time: floa
 
 async def log_response_stream(query_logger, session_id: str, start_time: float, status_code: int, result: dict):
     """Log the streaming response metrics (legacy function)"""
-    try:
-        import sys
-        import time
-        sys.path.append('..')
-        from logging_models.logging_models import ResponseLogData
+    if not query_logger.enabled:
+        return
         
+    try:
         execution_time_ms = int((time.time() - start_time) * 1000)
         llm_usage = result.get("llm_usage", {})
         
@@ -448,6 +459,24 @@ async def log_response_stream(query_logger, session_id: str, start_time: float,
     except Exception as e:
         logger.error(f"Failed to log streaming response: {e}")
 
+def interleave_card_results(per_card_docs: list, limit: int) -> list:
+    """Merge per-card search results round-robin (best of each card first), dropping duplicates, up to limit"""
+    merged = []
+    seen = set()
+    for rank in range(max(map(len, per_card_docs), default=0)):
+        for docs in per_card_docs:
+            if rank >= len(docs):
+                continue
+            doc = docs[rank]
+            key = (doc.get('cardName'), doc.get('section'), doc.get('content'))
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(doc)
+            if len(merged) == limit:
+                return merged
+    return merged
+
 def is_current_info_query(query: str) -> bool:
     """Detect if query asks for current/latest information"""
     current_keywords = [
@@ -5,6 +5,7 @@ Session-based preferences only (Clerk handles authentication separately)
 
 from fastapi import APIRouter, HTTPException, Depends, Header, Request
 from typing import Optional
+import asyncio
 import uuid
 import logging
 
@@ -64,7 +65,7 @@ async def get_user_preferences(
 ):
     """Get preferences for authenticated Clerk user"""
     try:
-        prefs_response = preference_service.get_user_preferences(user_id)
+        prefs_response = await asyncio.to_thread(preference_service.get_user_preferences, user_id)
         
         if not prefs_response:
             logger.warning(f"⚠️ No preferences found for user: {user_id}")
@@ -88,7 +89,7 @@ async def save_user_preferences(
     """Save preferences for authenticated Clerk user"""
     try:
         # Save user preferences
-        response = preference_service.save_user_preferences(user_id, request.preferences)
+        response = await asyncio.to_thread(preference_service.save_user_preferences, user_id, request.preferences)
         
         logger.info(f"✅ User preferences saved: {user_id}")
         return response
@@ -106,7 +107,7 @@ async def clear_user_preferences(
     try:
         # Create empty preferences to clear existing ones
         empty_preferences = UserPreferences()
-        preference_service.save_user_preferences(user_id, empty_preferences)
+        await asyncio.to_thread(preference_service.save_user_preferences, user_id, empty_preferences)
         
         logger.info(f"✅ User preferences cleared for: {user_id}")
         return {"success": True, "message": "User preferences cleared successfully"}
@@ -128,7 +129,7 @@ async def save_session_preferences(
         session_id = request.session_id or preference_service.generate_session_id()
         
         # Save session preferences
-        result_session_id = preference_service.save_session_preferences(session_id, request.preferences)
+        result_session_id = await asyncio.to_thread(preference_service.save_session_preferences, session_id, request.preferences)
         
         logger.info(f"✅ Session preferences saved: {result_session_id}")
         return {
@@ -148,7 +149,7 @@ async def get_session_preferences(
 ):
     """Get preferences for a specific session"""
     try:
-        prefs = preference_service.get_session_preferences(session_id)
+        prefs = await asyncio.to_thread(preference_service.get_session_preferences, session_id)
         
         if not prefs:
             logger.warning(f"⚠️ No preferences found for session: {session_id}")
@@ -171,7 +172,7 @@ async def clear_session_preferences(
     try:
         # Create empty preferences to clear existing ones
         empty_preferences = UserPreferences()
-        preference_service.save_session_preferences(session_id, empty_preferences)
+        await asyncio.to_thread(preference_service.save_session_preferences, session_id, empty_preferences)
         
         logger.info(f"✅ Session preferences cleared for: {session_id}")
         return {"success": True, "message": "Session preferences cleared successfully"}
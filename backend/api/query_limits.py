@@ -2,13 +2,14 @@
 Query Limits API - Supabase-based system for authenticated users
 Handles rate limiting and query count tracking using Supabase
 """
+import asyncio
 from datetime import datetime
 from fastapi import APIRouter, HTTPException, Header, Depends
 from pydantic import BaseModel
 from typing import Optional
 import logging
 
-from services.supabase_service import SupabaseService
+from services.supabase_service import SupabaseService, get_supabase_service
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -26,11 +27,6 @@ class QueryIncrementRequest(BaseModel):
     user_id: str
     user_email: Optional[str] = None
 
-# Dependency to get SupabaseService
-def get_supabase_service() -> SupabaseService:
-    """Dependency to get SupabaseService instance"""
-    return SupabaseService()
-
 @router.get("/query-limits")
 async def get_query_limits(
     authorization: Optional[str] = Header(None),
@@ -45,7 +41,7 @@ async def get_query_limits(
         raise HTTPException(status_code=401, detail="Invalid authentication")
     
     try:
-        current_count, _ = db.get_user_query_count(user_id)
+        current_count, _ = await asyncio.to_thread(db.get_user_query_count, user_id)
         remaining = max(0, AUTHENTICATED_DAILY_LIMIT - current_count)
         
         logger.info(f"✅ Query limits retrieved for user {user_id}: {remaining} remaining")
@@ -76,7 +72,7 @@ async def increment_query(
     
     try:
         # Check current count before incrementing
-        current_count, _ = db.get_user_query_count(user_id)
+        current_count, _ = await asyncio.to_thread(db.get_user_query_count, user_id)
         
         if current_count >= AUTHENTICATED_DAILY_LIMIT:
             logger.warning(f"⚠️ Daily limit reached for user {user_id}")
@@ -86,7 +82,7 @@ async def increment_query(
             )
         
         # Increment count
-        new_count = db.increment_user_query_count(user_id, request.user_email)
+        new_count = await asyncio.to_thread(db.increment_user_query_count, user_id, request.user_email)
         remaining = max(0, AUTHENTICATED_DAILY_LIMIT - new_count)
         
         logger.info(f"✅ Query count incremented for user {user_id}: {new_count}/{AUTHENTICATED_DAILY_LIMIT}")
@@ -110,7 +106,7 @@ async def query_limits_health(db: SupabaseService = Depends(get_supabase_service
     """Health check for query limits service"""
     try:
         # Test database connection
-        connection_ok = db.test_connection()
+        connection_ok = await asyncio.to_thread(db.test_connection)
         
         if connection_ok:
             return {"status": "healthy", "database": "supabase", "service": "query_limits"}
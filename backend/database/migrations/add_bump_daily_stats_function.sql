@@ -0,0 +1,90 @@
+-- Migration: Replace read-modify-write daily stats with an atomic upsert RPC
+-- Date: 2026-10-16
+-- Description: daily_query_stats now stores running sums instead of averages so a
+-- single INSERT ... ON CONFLICT can update it. QueryLogger calls bump_daily_stats
+-- once per response instead of SELECT + UPDATE/INSERT, and reads averages from
+-- daily_query_stats_view.
+
+ALTER TABLE daily_query_stats
+ADD COLUMN IF NOT EXISTS sum_execution_time_ms BIGINT DEFAULT 0,
+ADD COLUMN IF NOT EXISTS sum_tokens_used BIGINT DEFAULT 0;
+
+-- Backfill running sums from the stored averages
+UPDATE daily_query_stats
+SET sum_execution_time_ms = ROUND(COALESCE(avg_execution_time_ms, 0) * successful_queries),
+    sum_tokens_used = ROUND(COALESCE(avg_tokens_used, 0) * successful_queries);
+
+ALTER TABLE daily_query_stats
+DROP COLUMN IF EXISTS avg_execution_time_ms,
+DROP COLUMN IF EXISTS avg_tokens_used;
+
+-- Atomic per-response update of daily_query_stats (one round trip, no lost updates).
+-- Running sums are stored; averages are derived in daily_query_stats_view.
+CREATE OR REPLACE FUNCTION bump_daily_stats(
+    p_date DATE,
+    p_model TEXT,
+    p_mode TEXT,
+    p_is_comparison BOOLEAN,
+    p_success BOOLEAN,
+    p_exec_ms INTEGER,
+    p_tokens INTEGER,
+    p_cost NUMERIC
+)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO daily_query_stats AS s (
+        date, total_queries, successful_queries, failed_queries,
+        gemini_flash_lite_queries, gemini_flash_queries, gemini_pro_queries,
+        general_queries, specific_card_queries, comparison_queries,
+        sum_execution_time_ms, sum_tokens_used, total_cost
+    ) VALUES (
+        p_date,
+        1,
+        CASE WHEN p_success THEN 1 ELSE 0 END,
+        CASE WHEN p_success THEN 0 ELSE 1 END,
+        CASE WHEN p_model = 'gemini-2.5-flash-lite' THEN 1 ELSE 0 END,
+        CASE WHEN p_model = 'gemini-1.5-flash' THEN 1 ELSE 0 END,
+        CASE WHEN p_model = 'gemini-1.5-pro' THEN 1 ELSE 0 END,
+        CASE WHEN p_mode = 'General Query' THEN 1 ELSE 0 END,
+        CASE WHEN p_mode = 'Specific Card' THEN 1 ELSE 0 END,
+        CASE WHEN p_is_comparison THEN 1 ELSE 0 END,
+        CASE WHEN p_success THEN COALESCE(p_exec_ms, 0) ELSE 0 END,
+        CASE WHEN p_success THEN COALESCE(p_tokens, 0) ELSE 0 END,
+        COALESCE(p_cost, 0)
+    )
+    ON CONFLICT (date) DO UPDATE SET
+        total_queries = s.total_queries + 1,
+        successful_queries = s.successful_queries + EXCLUDED.successful_queries,
+        failed_queries = s.failed_queries + EXCLUDED.failed_queries,
+        gemini_flash_lite_queries = s.gemini_flash_lite_queries + EXCLUDED.gemini_flash_lite_queries,
+        gemini_flash_queries = s.gemini_flash_queries + EXCLUDED.gemini_flash_queries,
+        gemini_pro_queries = s.gemini_pro_queries + EXCLUDED.gemini_pro_queries,
+        general_queries = s.general_queries + EXCLUDED.general_queries,
+        specific_card_queries = s.specific_card_queries + EXCLUDED.specific_card_queries,
+        comparison_queries = s.comparison_queries + EXCLUDED.comparison_queries,
+        sum_execution_time_ms = s.sum_execution_time_ms + EXCLUDED.sum_execution_time_ms,
+        sum_tokens_used = s.sum_tokens_used + EXCLUDED.sum_tokens_used,
+        total_cost = s.total_cost + EXCLUDED.total_cost;
+END;
+$$;
+
+-- Daily stats with averages computed on read from the running sums
+CREATE OR REPLACE VIEW daily_query_stats_view AS
+SELECT
+    date,
+    total_queries,
+    successful_queries,
+    failed_queries,
+    gemini_flash_lite_queries,
+    gemini_flash_queries,
+    gemini_pro_queries,
+    general_queries,
+    specific_card_queries,
+    comparison_queries,
+    ROUND(sum_execution_time_ms::NUMERIC / NULLIF(successful_queries, 0), 2) AS avg_execution_time_ms,
+    ROUND(sum_tokens_used::NUMERIC / NULLIF(successful_queries, 0), 2) AS avg_tokens_used,
+    total_cost,
+    created_at
+FROM daily_query_stats;
@@ -0,0 +1,35 @@
+-- Migration: Run GDPR cleanup server-side
+-- Date: 2026-10-16
+-- Description: cleanup_expired_logs used PostgREST delete/update calls whose
+-- responses carried every affected row just so they could be counted. gdpr_cleanup
+-- runs both statements in one transaction and returns only the counts.
+
+-- GDPR cleanup in one transaction: delete expired query logs, anonymize those older
+-- than p_anonymize_after days, and return only the two row counts
+CREATE OR REPLACE FUNCTION gdpr_cleanup(p_anonymize_after INTEGER)
+RETURNS TABLE(deleted INTEGER, anonymized INTEGER)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM query_logs
+    WHERE retention_expires_at < NOW();
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+
+    UPDATE query_logs
+    SET query_text = '[ANONYMIZED]',
+        enhanced_query = '[ANONYMIZED]',
+        user_ip_hash = NULL,
+        user_agent_hash = NULL,
+        is_anonymized = TRUE
+    WHERE created_at < NOW() - make_interval(days => p_anonymize_after)
+      AND is_anonymized = FALSE
+      AND retention_expires_at > NOW();
+    GET DIAGNOSTICS anonymized = ROW_COUNT;
+
+    RETURN NEXT;
+END;
+$$;
+
+-- Optional: run nightly with pg_cron instead of from the application
+-- (Supabase: enable the pg_cron extension first)
+-- SELECT cron.schedule('gdpr-cleanup', '0 3 * * *', $$SELECT * FROM gdpr_cleanup(30)$$);
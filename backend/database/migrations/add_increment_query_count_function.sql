@@ -0,0 +1,29 @@
+-- Migration: Add increment_query_count RPC
+-- Date: 2026-10-16
+-- Description: increment_user_query_count used to SELECT the current count, sometimes
+-- UPDATE it to reset for a new day, and then UPSERT the new value. That was two to
+-- three round trips and racy under concurrent queries. This function does the reset
+-- and increment atomically in one upsert.
+
+-- Increment a user's daily query count in one statement, resetting it on the first
+-- query of a new (UTC) day, and return the new count
+CREATE OR REPLACE FUNCTION increment_query_count(p_user_id TEXT, p_email TEXT DEFAULT NULL)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    today DATE := (NOW() AT TIME ZONE 'UTC')::DATE;
+    new_count INTEGER;
+BEGIN
+    INSERT INTO user_query_counts AS c (user_id, user_email, query_count, last_reset_date, updated_at)
+    VALUES (p_user_id, p_email, 1, today, NOW())
+    ON CONFLICT (user_id) DO UPDATE SET
+        query_count = CASE WHEN c.last_reset_date < today THEN 1 ELSE c.query_count + 1 END,
+        last_reset_date = today,
+        user_email = COALESCE(EXCLUDED.user_email, c.user_email),
+        updated_at = NOW()
+    RETURNING query_count INTO new_count;
+
+    RETURN new_count;
+END;
+$$;
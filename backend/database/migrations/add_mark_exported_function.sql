@@ -0,0 +1,41 @@
+-- Migration: Mark exports by predicate instead of by session ID list
+-- Date: 2026-10-16
+-- Description: Adds query_logs.export_id and the mark_exported RPC, which marks
+-- exported rows using the export's own filters. Replaces mark_sessions_exported,
+-- whose session ID array grew with the size of the export.
+
+ALTER TABLE query_logs
+ADD COLUMN IF NOT EXISTS export_id VARCHAR(255);
+
+-- Mark exported query logs with the same predicate the export used, so the
+-- request stays constant-size no matter how many rows were exported
+CREATE OR REPLACE FUNCTION mark_exported(
+    p_export_id TEXT,
+    p_snapshot_at TIMESTAMPTZ,
+    p_start TIMESTAMPTZ DEFAULT NULL,
+    p_end TIMESTAMPTZ DEFAULT NULL,
+    p_only_anon BOOLEAN DEFAULT FALSE,
+    p_include_failed BOOLEAN DEFAULT TRUE
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    updated_count INTEGER;
+BEGIN
+    UPDATE query_logs
+    SET is_exported = TRUE,
+        export_id = p_export_id
+    WHERE created_at <= p_snapshot_at
+      AND (p_start IS NULL OR created_at >= p_start)
+      AND (p_end IS NULL OR created_at < p_end)
+      AND (NOT p_only_anon OR is_anonymized)
+      AND (p_include_failed OR response_status = 200);
+
+    GET DIAGNOSTICS updated_count = ROW_COUNT;
+    RETURN updated_count;
+END;
+$$;
+
+-- Superseded by mark_exported
+DROP FUNCTION IF EXISTS mark_sessions_exported(TEXT[]);
@@ -0,0 +1,23 @@
+-- Migration: Add mark_sessions_exported RPC
+-- Date: 2026-10-16
+-- Description: Marks exported query logs in one UPDATE. The session IDs travel in
+-- the RPC request body as an array instead of a PostgREST `in` filter in the URL,
+-- so large exports no longer need many chunked UPDATE requests.
+-- Superseded: add_mark_exported_function.sql replaces this RPC with mark_exported
+-- and drops it. Apply both in order; nothing calls mark_sessions_exported anymore.
+
+CREATE OR REPLACE FUNCTION mark_sessions_exported(p_session_ids TEXT[])
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    updated_count INTEGER;
+BEGIN
+    UPDATE query_logs
+    SET is_exported = TRUE
+    WHERE session_id = ANY(p_session_ids);
+
+    GET DIAGNOSTICS updated_count = ROW_COUNT;
+    RETURN updated_count;
+END;
+$$;
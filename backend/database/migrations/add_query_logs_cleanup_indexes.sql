@@ -0,0 +1,13 @@
+-- Migration: Add indexes for GDPR cleanup
+-- Date: 2026-10-16
+-- Description: cleanup_expired_logs deletes rows by retention_expires_at and
+-- anonymizes rows by created_at among those not yet anonymized. The partial index
+-- below only covers rows still awaiting anonymization, so the anonymize pass
+-- doesn't have to scan rows that were already processed. The retention and
+-- session_id indexes are also in supabase_schema.sql; they are repeated here so
+-- older databases get them.
+
+CREATE INDEX IF NOT EXISTS idx_query_logs_retention ON query_logs(retention_expires_at);
+CREATE INDEX IF NOT EXISTS idx_query_logs_session_id ON query_logs(session_id);
+CREATE INDEX IF NOT EXISTS idx_query_logs_anonymize
+    ON query_logs(created_at) WHERE is_anonymized = FALSE;
@@ -0,0 +1,8 @@
+-- Migration: Add composite index for training data exports
+-- Date: 2026-10-16
+-- Description: export_training_data filters query_logs on is_anonymized and
+-- response_status and scans a created_at range ordered newest first. This index
+-- turns that into an index range scan instead of a full table scan.
+
+CREATE INDEX IF NOT EXISTS idx_query_logs_export
+    ON query_logs(is_anonymized, response_status, created_at DESC);
@@ -0,0 +1,16 @@
+-- Migration: Store comparison classification on query_logs
+-- Date: 2026-10-16
+-- Description: QueryLogger now classifies comparison queries once at ingest time
+-- instead of lower-casing query_text on every response. The partial index supports
+-- "comparison queries over time" analytics.
+
+ALTER TABLE query_logs
+ADD COLUMN IF NOT EXISTS is_comparison BOOLEAN DEFAULT FALSE;
+
+-- Backfill existing rows with the same rule the logger applies
+UPDATE query_logs
+SET is_comparison = TRUE
+WHERE query_text ILIKE '%compare%';
+
+CREATE INDEX IF NOT EXISTS idx_query_logs_comparison
+    ON query_logs(created_at) WHERE is_comparison;
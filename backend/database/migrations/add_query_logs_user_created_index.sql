@@ -0,0 +1,21 @@
+-- Migration: Index query_logs for per-user history reads
+-- Date: 2026-10-16
+-- Description: get_query_logs filters on user_id and reads the newest rows first
+-- (ORDER BY created_at DESC LIMIT n). With only idx_query_logs_user_id, Postgres
+-- has to fetch and sort all of a user's rows. The composite index returns them
+-- already in order, so the LIMIT stops early. It also serves plain user_id
+-- lookups, which makes the single-column index redundant.
+--
+-- The other lookups named alongside this one are already indexed. user_query_counts.user_id
+-- is UNIQUE (and has idx_user_query_counts_user_id). session_preferences.session_id is
+-- the primary key, so the expires_at check is applied to one row.
+--
+-- CONCURRENTLY cannot run inside a transaction block: run each statement on its own.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_query_logs_user_created
+    ON query_logs(user_id, created_at DESC);
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_query_logs_user_id;
+
+-- Verify (expect an Index Scan using idx_query_logs_user_created, no Sort node):
+-- EXPLAIN SELECT * FROM query_logs WHERE user_id = 'user_x' ORDER BY created_at DESC LIMIT 100;
@@ -0,0 +1,69 @@
+-- Migration: Rebuild daily stats server-side
+-- Date: 2026-10-16
+-- Description: QueryLogger.rebuild_daily_stats paged through query_logs client-side
+-- and upserted only the days that had answered queries, so days whose queries had all
+-- been deleted kept stale counts, and increments made during the rebuild could be
+-- overwritten. rebuild_daily_stats recomputes every date in the range in one locked
+-- statement.
+
+-- Recompute daily_query_stats from query_logs for every UTC date from p_start through
+-- today in one statement, overwriting all counters. Dates without answered queries
+-- are written as zeros, so stale counts don't survive a rebuild. The table lock makes
+-- concurrent update_query_responses increments (and other rebuilds) wait until this
+-- one commits instead of being overwritten by it.
+CREATE OR REPLACE FUNCTION rebuild_daily_stats(p_start DATE)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    rebuilt_count INTEGER;
+BEGIN
+    LOCK TABLE daily_query_stats IN SHARE ROW EXCLUSIVE MODE;
+
+    INSERT INTO daily_query_stats AS s (
+        date, total_queries, successful_queries, failed_queries,
+        gemini_flash_lite_queries, gemini_flash_queries, gemini_pro_queries,
+        general_queries, specific_card_queries, comparison_queries,
+        sum_execution_time_ms, sum_tokens_used, total_cost
+    )
+    SELECT
+        d.day::DATE,
+        COUNT(q.id),
+        COUNT(q.id) FILTER (WHERE q.response_status = 200),
+        COUNT(q.id) FILTER (WHERE q.response_status <> 200),
+        COUNT(q.id) FILTER (WHERE q.selected_model = 'gemini-2.5-flash-lite'),
+        COUNT(q.id) FILTER (WHERE q.selected_model = 'gemini-1.5-flash'),
+        COUNT(q.id) FILTER (WHERE q.selected_model = 'gemini-1.5-pro'),
+        COUNT(q.id) FILTER (WHERE q.query_mode = 'General Query'),
+        COUNT(q.id) FILTER (WHERE q.query_mode = 'Specific Card'),
+        COUNT(q.id) FILTER (WHERE q.is_comparison),
+        COALESCE(SUM(q.execution_time_ms) FILTER (WHERE q.response_status = 200), 0),
+        COALESCE(SUM(q.llm_tokens_used) FILTER (WHERE q.response_status = 200), 0),
+        COALESCE(SUM(q.llm_cost), 0)
+    FROM generate_series(
+        p_start::TIMESTAMP, (NOW() AT TIME ZONE 'UTC')::DATE::TIMESTAMP, INTERVAL '1 day'
+    ) AS d(day)
+    -- response_status 0 means no response was logged
+    LEFT JOIN query_logs q
+        ON q.created_at >= d.day AT TIME ZONE 'UTC'
+       AND q.created_at < (d.day + INTERVAL '1 day') AT TIME ZONE 'UTC'
+       AND q.response_status <> 0
+    GROUP BY d.day
+    ON CONFLICT (date) DO UPDATE SET
+        total_queries = EXCLUDED.total_queries,
+        successful_queries = EXCLUDED.successful_queries,
+        failed_queries = EXCLUDED.failed_queries,
+        gemini_flash_lite_queries = EXCLUDED.gemini_flash_lite_queries,
+        gemini_flash_queries = EXCLUDED.gemini_flash_queries,
+        gemini_pro_queries = EXCLUDED.gemini_pro_queries,
+        general_queries = EXCLUDED.general_queries,
+        specific_card_queries = EXCLUDED.specific_card_queries,
+        comparison_queries = EXCLUDED.comparison_queries,
+        sum_execution_time_ms = EXCLUDED.sum_execution_time_ms,
+        sum_tokens_used = EXCLUDED.sum_tokens_used,
+        total_cost = EXCLUDED.total_cost;
+
+    GET DIAGNOSTICS rebuilt_count = ROW_COUNT;
+    RETURN rebuilt_count;
+END;
+$$;
@@ -0,0 +1,85 @@
+-- Migration: Batch response updates and daily stats into one RPC
+-- Date: 2026-10-16
+-- Description: QueryLogger's background writer sends every response in a batch to
+-- update_query_responses as a JSON array, replacing one UPDATE plus one
+-- bump_daily_stats call per response.
+
+-- Apply a batch of logged responses in one round trip: one UPDATE of query_logs
+-- joined against the JSON rows, then one aggregated upsert into daily_query_stats.
+-- Rows without selected_model (query metadata unknown) only update query_logs.
+CREATE OR REPLACE FUNCTION update_query_responses(p_date DATE, p_rows JSONB)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    updated_count INTEGER;
+BEGIN
+    UPDATE query_logs q
+    SET response_status = r.response_status,
+        execution_time_ms = r.execution_time_ms,
+        llm_tokens_used = r.llm_tokens_used,
+        llm_cost = r.llm_cost,
+        search_results_count = r.search_results_count
+    FROM jsonb_to_recordset(p_rows) AS r(
+        session_id TEXT,
+        response_status INTEGER,
+        execution_time_ms INTEGER,
+        llm_tokens_used INTEGER,
+        llm_cost NUMERIC,
+        search_results_count INTEGER
+    )
+    WHERE q.session_id = r.session_id;
+
+    GET DIAGNOSTICS updated_count = ROW_COUNT;
+
+    INSERT INTO daily_query_stats AS s (
+        date, total_queries, successful_queries, failed_queries,
+        gemini_flash_lite_queries, gemini_flash_queries, gemini_pro_queries,
+        general_queries, specific_card_queries, comparison_queries,
+        sum_execution_time_ms, sum_tokens_used, total_cost
+    )
+    SELECT
+        p_date,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE r.response_status = 200),
+        COUNT(*) FILTER (WHERE r.response_status <> 200),
+        COUNT(*) FILTER (WHERE r.selected_model = 'gemini-2.5-flash-lite'),
+        COUNT(*) FILTER (WHERE r.selected_model = 'gemini-1.5-flash'),
+        COUNT(*) FILTER (WHERE r.selected_model = 'gemini-1.5-pro'),
+        COUNT(*) FILTER (WHERE r.query_mode = 'General Query'),
+        COUNT(*) FILTER (WHERE r.query_mode = 'Specific Card'),
+        COUNT(*) FILTER (WHERE r.is_comparison),
+        COALESCE(SUM(r.execution_time_ms) FILTER (WHERE r.response_status = 200), 0),
+        COALESCE(SUM(r.llm_tokens_used) FILTER (WHERE r.response_status = 200), 0),
+        COALESCE(SUM(r.llm_cost), 0)
+    FROM jsonb_to_recordset(p_rows) AS r(
+        response_status INTEGER,
+        execution_time_ms INTEGER,
+        llm_tokens_used INTEGER,
+        llm_cost NUMERIC,
+        selected_model TEXT,
+        query_mode TEXT,
+        is_comparison BOOLEAN
+    )
+    WHERE r.selected_model IS NOT NULL
+    HAVING COUNT(*) > 0
+    ON CONFLICT (date) DO UPDATE SET
+        total_queries = s.total_queries + EXCLUDED.total_queries,
+        successful_queries = s.successful_queries + EXCLUDED.successful_queries,
+        failed_queries = s.failed_queries + EXCLUDED.failed_queries,
+        gemini_flash_lite_queries = s.gemini_flash_lite_queries + EXCLUDED.gemini_flash_lite_queries,
+        gemini_flash_queries = s.gemini_flash_queries + EXCLUDED.gemini_flash_queries,
+        gemini_pro_queries = s.gemini_pro_queries + EXCLUDED.gemini_pro_queries,
+        general_queries = s.general_queries + EXCLUDED.general_queries,
+        specific_card_queries = s.specific_card_queries + EXCLUDED.specific_card_queries,
+        comparison_queries = s.comparison_queries + EXCLUDED.comparison_queries,
+        sum_execution_time_ms = s.sum_execution_time_ms + EXCLUDED.sum_execution_time_ms,
+        sum_tokens_used = s.sum_tokens_used + EXCLUDED.sum_tokens_used,
+        total_cost = s.total_cost + EXCLUDED.total_cost;
+
+    RETURN updated_count;
+END;
+$$;
+
+-- Superseded by update_query_responses
+DROP FUNCTION IF EXISTS bump_daily_stats(DATE, TEXT, TEXT, BOOLEAN, BOOLEAN, INTEGER, INTEGER, NUMERIC);
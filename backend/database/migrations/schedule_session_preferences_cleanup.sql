@@ -0,0 +1,17 @@
+-- Migration: Expire session preferences with pg_cron
+-- Date: 2026-10-16
+-- Description: Deleting expired session_preferences rows was left to
+-- SupabaseService.cleanup_expired_sessions, which pays a PostgREST round trip and
+-- stalls whichever request triggers it. pg_cron now runs the delete inside the
+-- database every 10 minutes, using idx_session_preferences_expires. The Python
+-- method remains as a manual trigger.
+
+-- Supabase: pg_cron must be enabled (Database > Extensions) on the project
+CREATE EXTENSION IF NOT EXISTS pg_cron;
+
+-- Scheduling under an existing job name replaces that job, so this is safe to re-run
+SELECT cron.schedule(
+    'cleanup-session-preferences',
+    '*/10 * * * *',
+    $$DELETE FROM session_preferences WHERE expires_at < NOW()$$
+);
@@ -0,0 +1,98 @@
+-- Migration: Pre-aggregate daily stats per response batch
+-- Date: 2026-10-16
+-- Description: QueryLogger maps models and query modes to daily_query_stats counter
+-- columns with dict lookups and sends one set of totals per batch in p_stats.
+-- Model names are no longer hard-coded in SQL, and the upsert no longer re-reads
+-- the JSON rows.
+
+DROP FUNCTION IF EXISTS update_query_responses(DATE, JSONB);
+
+-- Apply a batch of logged responses in one round trip: one primary-key UPDATE of
+-- query_logs joined against the JSON rows (rows without an id fall back to
+-- matching on session_id), then one upsert adding the batch's daily stats
+-- counters, which QueryLogger pre-aggregates client-side.
+CREATE OR REPLACE FUNCTION update_query_responses(p_date DATE, p_rows JSONB, p_stats JSONB DEFAULT NULL)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    updated_count INTEGER;
+    fallback_count INTEGER;
+BEGIN
+    UPDATE query_logs q
+    SET response_status = r.response_status,
+        execution_time_ms = r.execution_time_ms,
+        llm_tokens_used = r.llm_tokens_used,
+        llm_cost = r.llm_cost,
+        search_results_count = r.search_results_count
+    FROM jsonb_to_recordset(p_rows) AS r(
+        id UUID,
+        response_status INTEGER,
+        execution_time_ms INTEGER,
+        llm_tokens_used INTEGER,
+        llm_cost NUMERIC,
+        search_results_count INTEGER
+    )
+    WHERE q.id = r.id;
+
+    GET DIAGNOSTICS updated_count = ROW_COUNT;
+
+    UPDATE query_logs q
+    SET response_status = r.response_status,
+        execution_time_ms = r.execution_time_ms,
+        llm_tokens_used = r.llm_tokens_used,
+        llm_cost = r.llm_cost,
+        search_results_count = r.search_results_count
+    FROM jsonb_to_recordset(p_rows) AS r(
+        id UUID,
+        session_id TEXT,
+        response_status INTEGER,
+        execution_time_ms INTEGER,
+        llm_tokens_used INTEGER,
+        llm_cost NUMERIC,
+        search_results_count INTEGER
+    )
+    WHERE r.id IS NULL AND q.session_id = r.session_id;
+
+    GET DIAGNOSTICS fallback_count = ROW_COUNT;
+    updated_count := updated_count + fallback_count;
+
+    IF COALESCE((p_stats->>'total_queries')::INTEGER, 0) > 0 THEN
+        INSERT INTO daily_query_stats AS s (
+            date, total_queries, successful_queries, failed_queries,
+            gemini_flash_lite_queries, gemini_flash_queries, gemini_pro_queries,
+            general_queries, specific_card_queries, comparison_queries,
+            sum_execution_time_ms, sum_tokens_used, total_cost
+        ) VALUES (
+            p_date,
+            (p_stats->>'total_queries')::INTEGER,
+            COALESCE((p_stats->>'successful_queries')::INTEGER, 0),
+            COALESCE((p_stats->>'failed_queries')::INTEGER, 0),
+            COALESCE((p_stats->>'gemini_flash_lite_queries')::INTEGER, 0),
+            COALESCE((p_stats->>'gemini_flash_queries')::INTEGER, 0),
+            COALESCE((p_stats->>'gemini_pro_queries')::INTEGER, 0),
+            COALESCE((p_stats->>'general_queries')::INTEGER, 0),
+            COALESCE((p_stats->>'specific_card_queries')::INTEGER, 0),
+            COALESCE((p_stats->>'comparison_queries')::INTEGER, 0),
+            COALESCE((p_stats->>'sum_execution_time_ms')::BIGINT, 0),
+            COALESCE((p_stats->>'sum_tokens_used')::BIGINT, 0),
+            COALESCE((p_stats->>'total_cost')::NUMERIC, 0)
+        )
+        ON CONFLICT (date) DO UPDATE SET
+            total_queries = s.total_queries + EXCLUDED.total_queries,
+            successful_queries = s.successful_queries + EXCLUDED.successful_queries,
+            failed_queries = s.failed_queries + EXCLUDED.failed_queries,
+            gemini_flash_lite_queries = s.gemini_flash_lite_queries + EXCLUDED.gemini_flash_lite_queries,
+            gemini_flash_queries = s.gemini_flash_queries + EXCLUDED.gemini_flash_queries,
+            gemini_pro_queries = s.gemini_pro_queries + EXCLUDED.gemini_pro_queries,
+            general_queries = s.general_queries + EXCLUDED.general_queries,
+            specific_card_queries = s.specific_card_queries + EXCLUDED.specific_card_queries,
+            comparison_queries = s.comparison_queries + EXCLUDED.comparison_queries,
+            sum_execution_time_ms = s.sum_execution_time_ms + EXCLUDED.sum_execution_time_ms,
+            sum_tokens_used = s.sum_tokens_used + EXCLUDED.sum_tokens_used,
+            total_cost = s.total_cost + EXCLUDED.total_cost;
+    END IF;
+
+    RETURN updated_count;
+END;
+$$;
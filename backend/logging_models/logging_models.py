@@ -34,6 +34,11 @@ class ResponseLogData(BaseModel):
     llm_tokens_used: int = Field(0, description="Tokens consumed by LLM")
     llm_cost: float = Field(0.0, description="Cost in USD for LLM usage")
     search_results_count: int = Field(0, description="Number of documents retrieved")
+    
+    # Query metadata for daily stats (saves re-reading the query log row)
+    selected_model: Optional[str] = Field(None, description="AI model selected for the query")
+    query_mode: Optional[str] = Field(None, description="Query mode of the query")
+    is_comparison: Optional[bool] = Field(None, description="Whether the query is a comparison query")
 
 class QueryLogEntry(BaseModel):
     """Complete query log entry for database storage"""
@@ -39,9 +39,9 @@ async def lifespan(app: FastAPI):
     try:
         # Initialize Supabase database service
         logger.info("🗄️ Initializing Supabase database service...")
-        from services.supabase_service import SupabaseService
+        from services.supabase_service import SupabaseService, get_supabase_service
         try:
-            supabase_service = SupabaseService()
+            supabase_service = get_supabase_service()
             # Test connection
             if supabase_service.test_connection():
                 app_state["supabase_service"] = supabase_service
@@ -89,7 +89,17 @@ async def lifespan(app: FastAPI):
             hash_salt=os.getenv("HASH_SALT_SECRET", "default-salt-change-in-production"),
             gdpr_compliance_mode=os.getenv("GDPR_COMPLIANCE_MODE", "true").lower() == "true"
         )
-        app_state["query_logger"] = QueryLogger(logging_config, app_state.get("supabase_service"))
+        # Optional read replica for analytics/export queries (falls back to the primary)
+        read_service = None
+        supabase_read_url = os.getenv("SUPABASE_READ_URL")
+        if supabase_read_url and app_state.get("supabase_service"):
+            try:
+                read_service = SupabaseService(supabase_url=supabase_read_url)
+                logger.info("✅ Supabase read replica configured for query logger reads")
+            except Exception as e:
+                logger.warning(f"⚠️ Supabase read replica unavailable, using primary: {e}")
+        
+        app_state["query_logger"] = QueryLogger(logging_config, app_state.get("supabase_service"), read_service)
         
         # Initialize preference service with Supabase
         from services.preference_service import PreferenceService
@@ -107,6 +117,8 @@ async def lifespan(app: FastAPI):
         raise
     finally:
         logger.info("🔄 Shutting down services...")
+        if app_state.get("query_logger"):
+            await app_state["query_logger"].shutdown()
 
 # Create FastAPI app
 app = FastAPI(
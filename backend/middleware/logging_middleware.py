@@ -33,7 +33,7 @@ class QueryLoggingMiddleware:
             return
             
         # Skip if logging is disabled or no logger available
-        if not self.query_logger or not self.query_logger.config.enabled:
+        if not self.query_logger or not self.query_logger.enabled:
             await self.app(scope, receive, send)
             return
             
@@ -137,7 +137,7 @@ async def log_detailed_metrics(query_logger, session_id: str, metrics: dict):
     Manually update query log with detailed metrics from chat endpoint
     Call this from the chat endpoint after getting LLM response
     """
-    if not query_logger or not session_id:
+    if not query_logger or not query_logger.enabled or not session_id:
         return
         
     try:
@@ -22,6 +22,8 @@ class CardConfigService:
         self._cards_by_display_name = {}
         self._cards_by_jsonl_name = {}
         self._alias_map = {}
+        self._active_cards = []
+        self._display_names = []
         self._load_config()
     
     def _load_config(self):
@@ -34,6 +36,7 @@ class CardConfigService:
             if not config_path.exists():
                 logger.error(f"Card configuration file not found: {config_path}")
                 self._config = {"supported_cards": []}
+                self._build_lookup_maps()
                 return
             
             with open(config_path, 'r', encoding='utf-8') as f:
@@ -47,6 +50,7 @@ class CardConfigService:
         except Exception as e:
             logger.error(f"Failed to load card configuration: {e}")
             self._config = {"supported_cards": []}
+            self._build_lookup_maps()
     
     def _build_lookup_maps(self):
         """Build efficient lookup maps for different card identifiers"""
@@ -55,9 +59,11 @@ class CardConfigService:
         self._cards_by_jsonl_name.clear()
         self._alias_map.clear()
         
-        for card in self._config.get("supported_cards", []):
-            if not card.get("active", True):
-                continue
+        # Active cards and their display names are read on every request; filter once per load
+        self._active_cards = [card for card in self._config.get("supported_cards", []) if card.get("active", True)]
+        self._display_names = [card["display_name"] for card in self._active_cards]
+        
+        for card in self._active_cards:
             
             card_id = card["id"]
             
@@ -79,7 +85,7 @@ class CardConfigService:
     
     def get_all_active_cards(self) -> List[Dict[str, Any]]:
         """Get all active cards"""
-        return [card for card in self._config.get("supported_cards", []) if card.get("active", True)]
+        return list(self._active_cards)
     
     def get_card_by_id(self, card_id: str) -> Optional[Dict[str, Any]]:
         """Get card by its ID"""
@@ -99,11 +105,11 @@ class CardConfigService:
     
     def get_display_names(self) -> List[str]:
         """Get list of all active card display names"""
-        return [card["display_name"] for card in self.get_all_active_cards()]
+        return list(self._display_names)
     
     def get_jsonl_names(self) -> List[str]:
         """Get list of all active card JSONL names"""
-        return [card["jsonl_name"] for card in self.get_all_active_cards()]
+        return [card["jsonl_name"] for card in self._active_cards]
     
     def get_aliases_for_card(self, card_id: str) -> List[str]:
         """Get all aliases for a specific card"""
@@ -112,7 +118,7 @@ class CardConfigService:
     
     def get_card_name_mapping(self) -> Dict[str, str]:
         """Get mapping from JSONL names to display names"""
-        return {card["jsonl_name"]: card["display_name"] for card in self.get_all_active_cards()}
+        return {card["jsonl_name"]: card["display_name"] for card in self._active_cards}
     
     def get_category_summary(self, category: str) -> Optional[str]:
         """Get category summary text"""
@@ -130,7 +136,7 @@ class CardConfigService:
         search_lower = search_text.lower()
         matching_cards = []
         
-        for card in self.get_all_active_cards():
+        for card in self._active_cards:
             # Check display name
             if search_lower in card["display_name"].lower():
                 matching_cards.append(card)
@@ -9,10 +9,15 @@ from typing import List, Dict, Any
 import logging
 import json
 import re
+from collections import defaultdict
 from services.card_config import get_card_config
 
 logger = logging.getLogger(__name__)
 
+# Most document text _build_context passes to the model; no single document can contribute more,
+# so callers may cap retrieved content at this length without changing the answer
+LLM_CONTEXT_CHARS = 15000
+
 
 class LLMService:
     """Service for generating answers using Google Gemini models"""
@@ -200,24 +205,27 @@ class LLMService:
         """
         context_parts = []
         
-        # For comparison queries, ensure balanced representation
-        card_names = set(doc.get('cardName', '') for doc in documents)
-        is_comparison = len(card_names) > 1
+        # For comparison queries, ensure balanced representation.
+        # Group documents by card name in a single pass (document order kept per card)
+        card_docs = defaultdict(list)
+        for doc in documents:
+            card_docs[doc.get('cardName', '')].append(doc)
+        is_comparison = len(card_docs) > 1
         
         if is_comparison:
-            # Group documents by card name for balanced representation
-            card_docs = {}
-            for doc in documents:
-                card_name = doc.get('cardName', '')
-                if card_name not in card_docs:
-                    card_docs[card_name] = []
-                card_docs[card_name].append(doc)
-            
             # Limit per card to ensure all cards are represented
-            max_context_chars = 15000
-            chars_per_card = max_context_chars // len(card_names)
+            max_context_chars = LLM_CONTEXT_CHARS
+            chars_per_card = max_context_chars // len(card_docs)
             
             for card_name, docs in card_docs.items():
+                # Card already within its share: take every document without per-doc budgeting
+                if sum(len(doc.get('content', '')) for doc in docs) <= chars_per_card:
+                    context_parts.extend(
+                        f"Source Document for '{doc['cardName']}' (section: {doc['section']}):\n{doc.get('content', '')}"
+                        for doc in docs
+                    )
+                    continue
+                
                 current_card_chars = 0
                 for doc in docs:
                     content = doc.get('content', '')
@@ -234,7 +242,7 @@ class LLMService:
                     current_card_chars += len(content)
         else:
             # Single card or general query - use original logic
-            max_context_chars = 15000
+            max_context_chars = LLM_CONTEXT_CHARS
             current_chars = 0
             
             for doc in documents:
@@ -10,6 +10,59 @@ from services.card_config import get_card_config
 
 logger = logging.getLogger(__name__)
 
+# Extra search terms per detected category, as (trigger keywords, addendum, log label).
+# Rules are tried in order and the first whose keywords appear in the query applies;
+# a rule with no keywords always applies.
+CATEGORY_ENHANCEMENTS = {
+    # Fix insurance ambiguity: distinguish between spending on insurance vs insurance benefits
+    'insurance': [
+        # Earning rewards when paying insurance premiums
+        (['spend', 'spending', 'spends', 'rewards', 'points', 'earn', 'rate'],
+         "insurance spending rewards caps monthly limit premium",
+         "insurance spending rewards (not benefits)"),
+        # Insurance coverage provided by the card
+        (['coverage', 'benefit', 'travel insurance', 'accident', 'protection'],
+         "insurance coverage benefits travel accident protection",
+         "insurance benefits/coverage (not spending)"),
+    ],
+    # Government payments: terms that definitely work based on testing - focus on "excluded categories"
+    'government': [
+        ([], "excluded categories reward points", "government payment rewards with specific search terms"),
+    ],
+}
+
+DIRECT_COMPARISON_PATTERNS = [
+    r'\bbetween\s+(\w+).*?and\s+(\w+)', 
+    r'(\w+)\s+vs\s+(\w+)', 
+    r'(\w+)\s+versus\s+(\w+)',
+    r'compare\s+(\w+).*?and\s+(\w+)',
+    r'(\w+)\s+or\s+(\w+)',
+    r'(\w+)\s+better\s+than\s+(\w+)'
+]
+
+def _any_keyword_re(keywords) -> re.Pattern:
+    """Substring match for any of the keywords in a single regex search."""
+    return re.compile('|'.join(map(re.escape, keywords)))
+
+def _grouped_keyword_re(keyword_groups: Dict[str, list]) -> Tuple[Optional[re.Pattern], list]:
+    """
+    One pattern with a capture group per keyword list, in priority order, plus the group
+    names. The lookahead tries every start position, so matches may overlap like plain
+    substring checks, and at each position the earliest group wins.
+    """
+    names = [name for name, keywords in keyword_groups.items() if keywords]
+    if not names:
+        return None, names
+    alternatives = '|'.join('(' + '|'.join(map(re.escape, keyword_groups[name])) + ')' for name in names)
+    return re.compile(f'(?=(?:{alternatives}))'), names
+
+def _first_group(pattern: Optional[re.Pattern], names: list, text: str) -> Optional[str]:
+    """Name of the earliest-priority group matching anywhere in text, or None."""
+    if pattern is None:
+        return None
+    best = min((m.lastindex for m in pattern.finditer(text)), default=None)
+    return names[best - 1] if best is not None else None
+
 class QueryEnhancer:
     """Enhances user queries to improve LLM accuracy for credit card calculations"""
     
@@ -38,6 +91,9 @@ class QueryEnhancer:
             
             # Build name mapping (display_name -> jsonl_name)
             self.card_name_mapping[display_name] = jsonl_name
+        
+        # All aliases in one pass; earlier cards win, as with the ordered per-card checks
+        self._card_re, self._card_names = _grouped_keyword_re(self.card_patterns)
     
     def _initialize_patterns(self):
         
@@ -71,54 +127,45 @@ class QueryEnhancer:
         self.comparison_patterns = [
             'which card', 'best card', 'compare', 'vs', 'versus', 'better'
         ]
+        
+        # Compiled once so each query is scanned in a single regex pass per check
+        self._category_re, self._category_names = _grouped_keyword_re(self.category_patterns)
+        self._amount_res = [re.compile(pattern, re.IGNORECASE) for pattern in self.amount_patterns]
+        self._comparison_re = _any_keyword_re(self.comparison_patterns)
+        self._direct_comparison_res = [re.compile(pattern) for pattern in DIRECT_COMPARISON_PATTERNS]
+        self._category_enhancements = {
+            category: [
+                (_any_keyword_re(keywords) if keywords else None, addendum, label)
+                for keywords, addendum, label in rules
+            ]
+            for category, rules in CATEGORY_ENHANCEMENTS.items()
+        }
     
-    def detect_card_name(self, query: str) -> Optional[str]:
+    def detect_card_name(self, query: str, query_lower: str = None) -> Optional[str]:
         """Detect credit card name from the query."""
-        query_lower = query.lower()
-        for card_name, keywords in self.card_patterns.items():
-            if any(keyword in query_lower for keyword in keywords):
-                return card_name
-        return None
+        return _first_group(self._card_re, self._card_names, query_lower or query.lower())
     
-    def detect_category(self, query: str) -> Optional[str]:
+    def detect_category(self, query: str, query_lower: str = None) -> Optional[str]:
         """Detect spending category from query"""
-        query_lower = query.lower()
-        
-        # Check each category
-        for category, keywords in self.category_patterns.items():
-            if any(keyword in query_lower for keyword in keywords):
-                return category
-        
-        return None
+        return _first_group(self._category_re, self._category_names, query_lower or query.lower())
     
     def detect_spend_amount(self, query: str) -> Optional[str]:
         """Extract spending amount from query"""
-        for pattern in self.amount_patterns:
-            match = re.search(pattern, query, re.IGNORECASE)
+        for pattern in self._amount_res:
+            match = pattern.search(query)
             if match:
                 return match.group(1).replace(',', '')
         return None
     
-    def is_comparison_query(self, query: str) -> bool:
+    def is_comparison_query(self, query: str, query_lower: str = None) -> bool:
         """Detect if this is a comparison query"""
-        query_lower = query.lower()
-        return any(pattern in query_lower for pattern in self.comparison_patterns)
+        return self._comparison_re.search(query_lower or query.lower()) is not None
     
-    def detect_direct_comparison(self, query: str) -> Optional[tuple]:
+    def detect_direct_comparison(self, query: str, query_lower: str = None) -> Optional[tuple]:
         """Detect direct card-to-card comparison queries"""
-        import re
-        
-        direct_comparison_patterns = [
-            r'\bbetween\s+(\w+).*?and\s+(\w+)', 
-            r'(\w+)\s+vs\s+(\w+)', 
-            r'(\w+)\s+versus\s+(\w+)',
-            r'compare\s+(\w+).*?and\s+(\w+)',
-            r'(\w+)\s+or\s+(\w+)',
-            r'(\w+)\s+better\s+than\s+(\w+)'
-        ]
-        
-        for pattern in direct_comparison_patterns:
-            match = re.search(pattern, query.lower())
+        query_lower = query_lower or query.lower()
+        for pattern in self._direct_comparison_res:
+            match = pattern.search(query_lower)
             if match:
                 logger.info(f"Direct comparison detected: {match.groups()}")
                 return match.groups()
@@ -132,11 +179,13 @@ class QueryEnhancer:
         Returns:
             Tuple of (enhanced_search_query, metadata)
         """
-        card_detected = self.detect_card_name(query)
-        category = self.detect_category(query)
+        # Lowercase once and share it across every detector
+        query_lower = query.lower()
+        card_detected = self.detect_card_name(query, query_lower)
+        category = self.detect_category(query, query_lower)
         spend_amount = self.detect_spend_amount(query)
-        is_comparison = self.is_comparison_query(query)
-        direct_comparison = self.detect_direct_comparison(query)
+        is_comparison = self.is_comparison_query(query, query_lower)
+        direct_comparison = self.detect_direct_comparison(query, query_lower)
         
         metadata = {
             'card_detected': card_detected,
@@ -148,34 +197,25 @@ class QueryEnhancer:
         }
         
         # Start with the original query - minimal enhancement approach
-        enhanced_query = query
+        parts = [query]
         
         # Only add card names for direct comparisons to ensure balanced retrieval
         if direct_comparison:
-            card1, card2 = direct_comparison
-            enhanced_query += f" {card1} {card2}"
+            parts.extend(direct_comparison)
             logger.info(f"Enhanced for direct comparison: {direct_comparison}")
         
         # Add basic category context only if spending amount is mentioned (calculation queries)
         if category and spend_amount:
-            enhanced_query += f" {category} spending rates"
-        
-        # Fix insurance ambiguity: distinguish between spending on insurance vs insurance benefits
-        if category == 'insurance':
-            if any(word in query.lower() for word in ['spend', 'spending', 'spends', 'rewards', 'points', 'earn', 'rate']):
-                # This is about earning rewards when paying insurance premiums
-                enhanced_query += " insurance spending rewards caps monthly limit premium"
-                logger.info("Enhanced for insurance spending rewards (not benefits)")
-            elif any(word in query.lower() for word in ['coverage', 'benefit', 'travel insurance', 'accident', 'protection']):
-                # This is about insurance coverage provided by the card
-                enhanced_query += " insurance coverage benefits travel accident protection"
-                logger.info("Enhanced for insurance benefits/coverage (not spending)")
-        
-        # Add government payment specific search terms for better Vertex AI matching
-        if category == 'government':
-            # Use terms that definitely work based on testing - focus on "excluded categories"
-            enhanced_query += " excluded categories reward points"
-            logger.info("Enhanced for government payment rewards with specific search terms")
+            parts.append(f"{category} spending rates")
+        
+        # Category-specific search terms for better Vertex AI matching
+        for trigger, addendum, label in self._category_enhancements.get(category, ()):
+            if trigger is None or trigger.search(query_lower):
+                parts.append(addendum)
+                logger.info(f"Enhanced for {label}")
+                break
+        
+        enhanced_query = ' '.join(parts)
         logger.info(f"Enhanced query: '{enhanced_query}', metadata: {metadata}")
         return enhanced_query, metadata
     
@@ -3,14 +3,27 @@ Privacy-first Query Logger Service - Supabase Version
 Handles all query logging with GDPR compliance and security features using Supabase
 """
 
+import asyncio
+import csv
+import functools
 import hashlib
 import logging
-from datetime import datetime, timedelta
-from typing import Optional, List, Dict
+import operator
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from collections import OrderedDict, defaultdict
+from typing import Optional, List, Dict, Tuple
 import json
 
 from .supabase_service import SupabaseService
 
+try:
+    import orjson
+except ImportError:  # Optional speedup for JSON exports; stdlib json is used otherwise
+    orjson = None
+
 try:
     from logging_models.logging_models import (
         QueryLogData, ResponseLogData, QueryLogEntry, QueryStatsEntry,
@@ -27,17 +40,122 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Columns included in training data exports (also the CSV header order)
+EXPORT_COLUMNS = (
+    'id', 'session_id', 'query_text', 'enhanced_query', 'selected_model', 'query_mode',
+    'card_filter', 'response_status', 'execution_time_ms', 'llm_tokens_used',
+    'llm_cost', 'search_results_count', 'created_at'
+)
+EXPORT_SELECT = ', '.join(EXPORT_COLUMNS)
+_export_values = operator.itemgetter(*EXPORT_COLUMNS)
+
+# Rows fetched per export page (matches PostgREST's default max-rows on Supabase)
+EXPORT_PAGE_SIZE = 1000
+
+# Columns read back for QueryLogEntry (query_logs columns the model actually has)
+SESSION_DATA_SELECT = ', '.join((
+    'session_id', 'query_text', 'enhanced_query', 'selected_model', 'query_mode',
+    'card_filter', 'top_k', 'response_status', 'execution_time_ms', 'llm_tokens_used',
+    'llm_cost', 'search_results_count', 'user_ip_hash', 'user_agent_hash',
+    'retention_expires_at', 'is_anonymized', 'is_exported'
+))
+
+# Stats view columns read back for QueryStatsEntry (exactly the model's fields)
+STATS_SELECT = ', '.join(QueryStatsEntry.model_fields)
+
+# BLAKE2b digest size in bytes for hashed PII (128-bit, 32 hex chars)
+PII_HASH_DIGEST_SIZE = 16
+
+# Bounded caches of recent PII hashes (traffic repeats a small set of IPs/User-Agents)
+IP_HASH_CACHE_SIZE = 4096
+USER_AGENT_HASH_CACHE_SIZE = 1024
+
+# Background log writer: ops are dropped (and counted) once the queue is full,
+# and queued rows are coalesced into one bulk insert per batch
+LOG_QUEUE_MAXSIZE = 1024
+LOG_BATCH_SIZE = 200
+LOG_BATCH_WINDOW = 0.05  # seconds to keep collecting ops after the first one arrives
+
+# daily_query_stats counter column for each model / query mode
+MODEL_STATS_COLUMNS = {
+    'gemini-2.5-flash-lite': 'gemini_flash_lite_queries',
+    'gemini-1.5-flash': 'gemini_flash_queries',
+    'gemini-1.5-pro': 'gemini_pro_queries'
+}
+MODE_STATS_COLUMNS = {
+    'General Query': 'general_queries',
+    'Specific Card': 'specific_card_queries'
+}
+
+# How long the cached UTC date string (stats date for responses of unknown queries) stays valid
+TODAY_CACHE_SECONDS = 30
+
+# Max sessions whose query metadata is kept in memory until their response is logged
+SESSION_META_MAXSIZE = 10000
+
+# Query rows are held until their response arrives and inserted once, complete;
+# rows still waiting after PENDING_TIMEOUT_SECONDS are written with response_status=0
+PENDING_MAXSIZE = 2000
+PENDING_TIMEOUT_SECONDS = 60
+PENDING_SWEEP_INTERVAL = 5
+
+def _json_bytes(row: Dict) -> bytes:
+    """Serialize one export row to JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(row, default=str, option=orjson.OPT_NAIVE_UTC)
+    return json.dumps(row, default=str).encode()
+
 class QueryLogger:
     """Privacy-first query logging service with GDPR compliance using Supabase"""
     
-    def __init__(self, config: LoggingConfig, supabase_service: SupabaseService = None):
+    def __init__(self, config: LoggingConfig, supabase_service: SupabaseService = None,
+                 read_service: SupabaseService = None):
         self.config = config
         
+        # Callers check this before awaiting log_query/log_response, so a disabled
+        # logger costs an attribute read instead of a coroutine per request
+        self.enabled = config.enabled
+        
         if supabase_service:
             self.db = supabase_service
         else:
             self.db = SupabaseService()
         
+        # Analytics/export reads go through a separate client (e.g. a read replica)
+        # so they don't queue behind log writes on the same connection pool
+        self.read_db = read_service or self.db
+        
+        # Keyed BLAKE2b hasher (the salt is the MAC key); copied per call so the key
+        # block is only processed once. Keys are capped at 64 bytes, so longer salts
+        # are first reduced to a 64-byte digest.
+        salt_bytes = self.config.hash_salt.encode()
+        if len(salt_bytes) > hashlib.blake2b.MAX_KEY_SIZE:
+            salt_bytes = hashlib.blake2b(salt_bytes).digest()
+        self._base_hasher = hashlib.blake2b(key=salt_bytes, digest_size=PII_HASH_DIGEST_SIZE)
+        
+        # Separate LRU caches so the long, low-cardinality UA strings don't evict IPs
+        self._hash_ip = functools.lru_cache(maxsize=IP_HASH_CACHE_SIZE)(self._hash_pii)
+        self._hash_user_agent = functools.lru_cache(maxsize=USER_AGENT_HASH_CACHE_SIZE)(self._hash_pii)
+        
+        # Precomputed retention period and (date string, monotonic time) cache for _today()
+        self._retention_delta = timedelta(days=self.config.retention_days)
+        self._today_cache = ("", float("-inf"))
+        
+        # session_id -> (log_id, selected_model, query_mode, is_comparison, created date); lets
+        # the response update hit the primary key and skip re-reading the row for stats
+        self._session_meta: "OrderedDict[str, Tuple[str, str, str, bool, str]]" = OrderedDict()
+        
+        # session_id -> (query row, monotonic time queued) awaiting its response
+        self._pending: "OrderedDict[str, Tuple[Dict, float]]" = OrderedDict()
+        self._sweep_task: Optional[asyncio.Task] = None
+        
+        # Background writer for query/response log ops (started lazily on first use);
+        # ('q', row, response_data) inserts a query log, complete when response_data is set;
+        # ('r', session_id, response_data) records the response for an already written row
+        self._log_queue: Optional[asyncio.Queue] = None
+        self._log_task: Optional[asyncio.Task] = None
+        self.dropped_logs = 0
+        
         logger.info("✅ QueryLogger initialized with Supabase backend")
         
     def _hash_pii(self, data: str) -> str:
@@ -45,33 +163,188 @@ class QueryLogger:
         if not data:
             return ""
         
-        # Combine data with salt and hash
-        salted_data = f"{data}{self.config.hash_salt}"
-        return hashlib.sha256(salted_data.encode()).hexdigest()
+        # Continue from the keyed state and hash the data
+        hasher = self._base_hasher.copy()
+        hasher.update(data.encode())
+        return hasher.hexdigest()
     
-    def _calculate_retention_expiry(self, custom_days: Optional[int] = None) -> datetime:
-        """Calculate when data should be deleted for GDPR compliance"""
-        days = custom_days or self.config.retention_days
-        return datetime.utcnow() + timedelta(days=days)
+    def _today(self) -> str:
+        """Current UTC date as YYYY-MM-DD, recomputed at most every TODAY_CACHE_SECONDS"""
+        now_mono = time.monotonic()
+        if now_mono - self._today_cache[1] > TODAY_CACHE_SECONDS:
+            self._today_cache = (datetime.now(timezone.utc).date().isoformat(), now_mono)
+        return self._today_cache[0]
+    
+    def _ensure_writer(self) -> asyncio.Queue:
+        """Start the background writer if it is not already running"""
+        if self._log_queue is None:
+            self._log_queue = asyncio.Queue(maxsize=LOG_QUEUE_MAXSIZE)
+        if self._log_task is None or self._log_task.done():
+            self._log_task = asyncio.create_task(self._drain_logs())
+        return self._log_queue
+    
+    def _enqueue(self, op: Tuple) -> bool:
+        """Hand a log op to the background writer without waiting; drops it when the queue is full"""
+        try:
+            self._ensure_writer().put_nowait(op)
+            return True
+        except asyncio.QueueFull:
+            self.dropped_logs += 1
+            logger.warning(f"Log queue full, dropped {op[0]!r} op ({self.dropped_logs} dropped so far)")
+            return False
+    
+    async def _drain_logs(self):
+        """Collect queued log ops for up to LOG_BATCH_WINDOW and write them as one batch"""
+        queue = self._log_queue
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + LOG_BATCH_WINDOW
+            while len(batch) < LOG_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                await self._write_batch(batch)
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} log ops: {e}")
+            finally:
+                for _ in batch:
+                    queue.task_done()
+    
+    async def _write_batch(self, batch: List[Tuple]):
+        """Insert all queued query rows in one call, then apply all responses in one RPC per stats day"""
+        # created_at was stamped when the query arrived; logged_at records the write itself
+        logged_at = datetime.now(timezone.utc).isoformat()
+        
+        query_rows = []
+        response_rows: Dict[str, Dict] = {}
+        # Daily stats counters per UTC date the queries were made on
+        stats_by_date: Dict[str, Dict] = defaultdict(lambda: defaultdict(int))
+        for op in batch:
+            if op[0] == 'q':
+                _, row, response_data = op
+                row['query_metadata']['logged_at'] = logged_at
+                if response_data is not None:
+                    row.update(self._response_fields(
+                        row['session_id'], response_data, stats_by_date, row['created_at'][:10]
+                    )[1])
+                query_rows.append(row)
+            else:
+                _, session_id, response_data = op
+                log_id, fields = self._response_fields(session_id, response_data, stats_by_date)
+                # A None id falls back to matching on session_id
+                response_rows[session_id] = {'id': log_id, 'session_id': session_id, **fields}
+        
+        if query_rows:
+            await asyncio.to_thread(self.db.log_queries_batch, query_rows)
+            logger.debug(f"Flushed {len(query_rows)} query logs")
+        
+        # Responses run after the inserts so their query rows always exist. The rows go
+        # with the first call; a batch spanning midnight adds one stats-only call per extra day.
+        rows = list(response_rows.values())
+        for stats_date in stats_by_date or ([self._today()] if rows else []):
+            rpc = self.db.client.rpc('update_query_responses', {
+                'p_date': stats_date,
+                'p_rows': rows,
+                'p_stats': stats_by_date.get(stats_date, {})
+            })
+            await asyncio.to_thread(rpc.execute)
+            rows = []
+        if response_rows:
+            logger.debug(f"Flushed {len(response_rows)} query responses")
+    
+    def _hold_pending(self, session_id: str, row: Dict):
+        """Keep a query row until its response arrives, writing out the oldest when full"""
+        if self._sweep_task is None or self._sweep_task.done():
+            self._sweep_task = asyncio.create_task(self._sweep_pending())
+        
+        # A new query on the same session: write the previous one out unanswered
+        previous = self._pending.pop(session_id, None)
+        if previous is not None:
+            self._enqueue(('q', previous[0], None))
+        
+        self._pending[session_id] = (row, time.monotonic())
+        if len(self._pending) > PENDING_MAXSIZE:
+            _, (oldest_row, _) = self._pending.popitem(last=False)
+            self._enqueue(('q', oldest_row, None))
+    
+    def _release_pending(self, older_than: float):
+        """Queue held query rows that have waited for a response since before older_than"""
+        while self._pending:
+            session_id, (row, queued_at) = next(iter(self._pending.items()))
+            if queued_at > older_than:
+                break
+            del self._pending[session_id]
+            self._enqueue(('q', row, None))
+    
+    async def _sweep_pending(self):
+        """Periodically write query rows whose response never arrived"""
+        while True:
+            await asyncio.sleep(PENDING_SWEEP_INTERVAL)
+            self._release_pending(time.monotonic() - PENDING_TIMEOUT_SECONDS)
+    
+    async def flush(self):
+        """Wait until every queued log op has been written"""
+        if self._log_queue is not None and self._log_task is not None:
+            await self._log_queue.join()
+    
+    async def shutdown(self):
+        """Write held and queued log ops, then stop the background tasks"""
+        if self._sweep_task is not None:
+            self._sweep_task.cancel()
+            self._sweep_task = None
+        
+        # Wait for queue space here rather than dropping held rows
+        while self._pending:
+            _, (row, _) = self._pending.popitem(last=False)
+            await self._ensure_writer().put(('q', row, None))
+        
+        await self.flush()
+        if self._log_task is not None:
+            self._log_task.cancel()
+            self._log_task = None
+    
+    @staticmethod
+    def is_comparison_query(query_text: str) -> bool:
+        """Classify a query as a comparison query for daily stats"""
+        return "compare" in query_text.casefold()
+    
+    def _remember_session_meta(self, session_id: str, meta: Tuple[str, str, str, bool, str]):
+        """Store query metadata for a session, evicting the oldest entries when full"""
+        self._session_meta[session_id] = meta
+        if len(self._session_meta) > SESSION_META_MAXSIZE:
+            self._session_meta.popitem(last=False)
     
     async def log_query(self, query_data: QueryLogData) -> str:
         """
         Log a user query with privacy protections
         Returns the session_id for tracking the response
+        Callers skip this entirely when `enabled` is False
         """
-        if not self.config.enabled:
-            return query_data.session_id
-            
         try:
             # Hash PII data for privacy
-            user_ip_hash = self._hash_pii(query_data.user_ip) if query_data.user_ip else None
-            user_agent_hash = self._hash_pii(query_data.user_agent) if query_data.user_agent else None
+            user_ip_hash = self._hash_ip(query_data.user_ip) if query_data.user_ip else None
+            user_agent_hash = self._hash_user_agent(query_data.user_agent) if query_data.user_agent else None
+            
+            # Classify once at ingest; stored so stats/analytics never re-scan query_text
+            is_comparison = self.is_comparison_query(query_data.query_text)
+            
+            # Primary key is generated here so the response can be applied by id
+            log_id = str(uuid.uuid4())
             
-            # Calculate retention expiry
-            retention_expires_at = self._calculate_retention_expiry()
+            # Stamped on arrival: the row may wait for its response before it is written
+            now = datetime.now(timezone.utc)
+            created_at = now.isoformat()
             
             # Prepare log data
             log_data = {
+                'id': log_id,
                 'session_id': query_data.session_id,
                 'query_text': query_data.query_text,
                 'enhanced_query': query_data.enhanced_query,
@@ -79,19 +352,26 @@ class QueryLogger:
                 'query_mode': query_data.query_mode,
                 'card_filter': query_data.card_filter,
                 'top_k': query_data.top_k,
-                'response_status': 0,  # Will be updated when response is logged
+                'is_comparison': is_comparison,
+                'response_status': 0,  # Replaced when the response is merged in
                 'user_ip_hash': user_ip_hash,
                 'user_agent_hash': user_agent_hash,
-                'retention_expires_at': retention_expires_at.isoformat(),
+                'created_at': created_at,
+                'retention_expires_at': (now + self._retention_delta).isoformat(),
                 'query_metadata': {
-                    'logged_at': datetime.utcnow().isoformat(),
                     'gdpr_compliant': self.config.gdpr_compliance_mode
                 }
             }
             
-            # Log to Supabase
-            log_id = self.db.log_query(log_data)
-            logger.info(f"Query logged for session {query_data.session_id} with ID {log_id}")
+            # Remember the row id and what daily stats need so the response path can skip a SELECT
+            self._remember_session_meta(
+                query_data.session_id,
+                (log_id, query_data.selected_model, query_data.query_mode, is_comparison, created_at[:10])
+            )
+            
+            # Held until the response arrives so the row is inserted once, complete
+            self._hold_pending(query_data.session_id, log_data)
+            logger.info(f"Query held for logging for session {query_data.session_id}")
             
             return query_data.session_id
             
@@ -100,147 +380,72 @@ class QueryLogger:
             return query_data.session_id  # Don't break the main flow
     
     async def log_response(self, session_id: str, response_data: ResponseLogData):
-        """Update query log with response metrics"""
-        if not self.config.enabled:
-            return
-            
+        """Update query log with response metrics (callers check `enabled` first)"""
         try:
-            # Get existing query logs for this session
-            query_logs = self.db.get_query_logs(limit=1)  # This will need to be filtered by session_id
-            
-            # For now, let's create a method to update query logs by session_id
-            await self._update_query_response(session_id, response_data)
-            
-            # Update daily statistics with complete query information
-            await self._update_daily_stats(session_id, response_data)
+            # Usually the query row is still held: write it once with the response merged in.
+            # Otherwise it was already written, so queue an update behind its insert.
+            pending = self._pending.pop(session_id, None)
+            if pending is not None:
+                op = ('q', pending[0], response_data)
+            else:
+                op = ('r', session_id, response_data)
             
-            logger.debug(f"Response logged for session {session_id}")
+            if self._enqueue(op):
+                logger.debug(f"Response queued for logging for session {session_id}")
             
         except Exception as e:
             logger.error(f"Failed to log response: {e}")
     
-    async def _update_query_response(self, session_id: str, response_data: ResponseLogData):
-        """Update the query log with response data using direct Supabase operations"""
-        try:
-            # We'll need to create a method in SupabaseService to update by session_id
-            update_data = {
-                'response_status': response_data.response_status,
-                'execution_time_ms': response_data.execution_time_ms,
-                'llm_tokens_used': response_data.llm_tokens_used,
-                'llm_cost': float(response_data.llm_cost),
-                'search_results_count': response_data.search_results_count
-            }
-            
-            # Update query logs table where session_id matches
-            result = self.db.client.table('query_logs').update(update_data).eq('session_id', session_id).execute()
-            
-            if result.data:
-                logger.debug(f"Query response updated for session {session_id}")
-            else:
-                logger.warning(f"No query log found for session {session_id}")
-                
-        except Exception as e:
-            logger.error(f"Failed to update query response: {e}")
+    @staticmethod
+    def _add_to_stats(stats: Dict, model_used: str, query_mode: str, is_comparison: bool,
+                      response_status: int, execution_time_ms: Optional[int],
+                      llm_tokens_used: Optional[int], llm_cost: Optional[float]):
+        """Add one answered query to a daily_query_stats counter dict (a defaultdict(int))"""
+        success = response_status == 200
+        stats['total_queries'] += 1
+        stats['successful_queries' if success else 'failed_queries'] += 1
+        if model_used in MODEL_STATS_COLUMNS:
+            stats[MODEL_STATS_COLUMNS[model_used]] += 1
+        if query_mode in MODE_STATS_COLUMNS:
+            stats[MODE_STATS_COLUMNS[query_mode]] += 1
+        if is_comparison:
+            stats['comparison_queries'] += 1
+        if success:
+            stats['sum_execution_time_ms'] += execution_time_ms or 0
+            stats['sum_tokens_used'] += llm_tokens_used or 0
+        stats['total_cost'] += llm_cost or 0
     
-    async def _update_daily_stats(self, session_id: str, response_data: ResponseLogData):
-        """Update daily aggregated statistics with detailed metrics"""
-        try:
-            today = datetime.utcnow().date().isoformat()
-            
-            # Get the complete query information for detailed stats
-            query_logs = self.db.client.table('query_logs').select('*').eq('session_id', session_id).execute()
-            
-            if not query_logs.data:
-                logger.warning(f"No query log found for session {session_id}")
-                return
-                
-            query_log = query_logs.data[0]
-            
-            # Categorize the query for detailed stats
-            model_used = query_log.get('selected_model')
-            query_mode = query_log.get('query_mode')
-            is_successful = response_data.response_status == 200
-            
-            # Model usage counters
-            gemini_flash_lite_increment = 1 if model_used == "gemini-2.5-flash-lite" else 0
-            gemini_flash_increment = 1 if model_used == "gemini-1.5-flash" else 0
-            gemini_pro_increment = 1 if model_used == "gemini-1.5-pro" else 0
-            
-            # Query type counters
-            general_increment = 1 if query_mode == "General Query" else 0
-            specific_card_increment = 1 if query_mode == "Specific Card" else 0
-            comparison_increment = 1 if "compare" in query_log.get('query_text', '').lower() else 0
-            
-            # Check if stats exist for today
-            existing_stats = self.db.client.table('daily_query_stats').select('*').eq('date', today).execute()
-            
-            if existing_stats.data:
-                # Update existing record with detailed metrics
-                existing = existing_stats.data[0]
-                
-                total_queries = existing['total_queries'] + 1
-                successful_queries = existing['successful_queries'] + (1 if is_successful else 0)
-                failed_queries = existing['failed_queries'] + (1 if not is_successful else 0)
-                
-                # Calculate new averages
-                new_avg_execution_time = None
-                new_avg_tokens = None
-                
-                if is_successful and successful_queries > 0:
-                    current_avg_time = existing.get('avg_execution_time_ms', 0) or 0
-                    new_avg_execution_time = round(
-                        (current_avg_time * (successful_queries - 1) + response_data.execution_time_ms) / successful_queries, 2
-                    )
-                    
-                    current_avg_tokens = existing.get('avg_tokens_used', 0) or 0
-                    new_avg_tokens = round(
-                        (current_avg_tokens * (successful_queries - 1) + response_data.llm_tokens_used) / successful_queries, 2
-                    )
-                else:
-                    new_avg_execution_time = existing.get('avg_execution_time_ms')
-                    new_avg_tokens = existing.get('avg_tokens_used')
-                
-                update_data = {
-                    'total_queries': total_queries,
-                    'successful_queries': successful_queries,
-                    'failed_queries': failed_queries,
-                    'gemini_flash_lite_queries': existing['gemini_flash_lite_queries'] + gemini_flash_lite_increment,
-                    'gemini_flash_queries': existing['gemini_flash_queries'] + gemini_flash_increment,
-                    'gemini_pro_queries': existing['gemini_pro_queries'] + gemini_pro_increment,
-                    'general_queries': existing['general_queries'] + general_increment,
-                    'specific_card_queries': existing['specific_card_queries'] + specific_card_increment,
-                    'comparison_queries': existing['comparison_queries'] + comparison_increment,
-                    'avg_execution_time_ms': new_avg_execution_time,
-                    'avg_tokens_used': new_avg_tokens,
-                    'total_cost': round(existing['total_cost'] + float(response_data.llm_cost), 6)
-                }
-                
-                self.db.client.table('daily_query_stats').update(update_data).eq('date', today).execute()
-                
-            else:
-                # Create new record with detailed metrics
-                insert_data = {
-                    'date': today,
-                    'total_queries': 1,
-                    'successful_queries': 1 if is_successful else 0,
-                    'failed_queries': 1 if not is_successful else 0,
-                    'gemini_flash_lite_queries': gemini_flash_lite_increment,
-                    'gemini_flash_queries': gemini_flash_increment,
-                    'gemini_pro_queries': gemini_pro_increment,
-                    'general_queries': general_increment,
-                    'specific_card_queries': specific_card_increment,
-                    'comparison_queries': comparison_increment,
-                    'avg_execution_time_ms': response_data.execution_time_ms if is_successful else None,
-                    'avg_tokens_used': response_data.llm_tokens_used if is_successful else None,
-                    'total_cost': float(response_data.llm_cost)
-                }
-                
-                self.db.client.table('daily_query_stats').insert(insert_data).execute()
-                    
-            logger.debug(f"Daily stats updated for {today}: model={model_used}, mode={query_mode}, cost={response_data.llm_cost}")
-                
-        except Exception as e:
-            logger.error(f"Failed to update daily stats: {e}")
+    def _response_fields(self, session_id: str, response_data: ResponseLogData,
+                         stats_by_date: Dict[str, Dict], created_date: Optional[str] = None
+                         ) -> Tuple[Optional[str], Dict]:
+        """
+        Return (log id, response columns) and add the response to the batch's daily stats
+        for the date its query was made (created_date, else the one log_query recorded)
+        """
+        # Prefer metadata passed in by the caller, then what log_query captured
+        log_id, *meta, meta_date = self._session_meta.pop(session_id, None) or (None, None, None, False, None)
+        if response_data.selected_model is not None:
+            meta = (response_data.selected_model, response_data.query_mode, bool(response_data.is_comparison))
+        
+        model_used, query_mode, is_comparison = meta
+        llm_cost = float(response_data.llm_cost)
+        
+        if model_used is None:
+            # Still update the query log, but leave daily stats alone
+            logger.warning(f"No query metadata for session {session_id}, skipping daily stats")
+        else:
+            self._add_to_stats(
+                stats_by_date[created_date or meta_date or self._today()], model_used, query_mode, is_comparison, response_data.response_status,
+                response_data.execution_time_ms, response_data.llm_tokens_used, llm_cost
+            )
+        
+        return log_id, {
+            'response_status': response_data.response_status,
+            'execution_time_ms': response_data.execution_time_ms,
+            'llm_tokens_used': response_data.llm_tokens_used,
+            'llm_cost': llm_cost,
+            'search_results_count': response_data.search_results_count
+        }
     
     async def cleanup_expired_logs(self) -> Dict[str, int]:
         """GDPR compliance - cleanup expired logs"""
@@ -248,27 +453,14 @@ class QueryLogger:
             return {"deleted": 0, "anonymized": 0}
             
         try:
-            now = datetime.utcnow().isoformat()
-            deleted_count = 0
-            anonymized_count = 0
-            
-            # Delete fully expired logs
-            deleted_result = self.db.client.table('query_logs').delete().lt('retention_expires_at', now).execute()
-            deleted_count = len(deleted_result.data) if deleted_result.data else 0
-            
-            # Anonymize logs that should be anonymized but not deleted
-            anonymize_before = (datetime.utcnow() - timedelta(days=self.config.anonymize_after_days)).isoformat()
-            
-            anonymize_data = {
-                'query_text': '[ANONYMIZED]',
-                'enhanced_query': '[ANONYMIZED]',
-                'user_ip_hash': None,
-                'user_agent_hash': None,
-                'is_anonymized': True
-            }
-            
-            anonymized_result = self.db.client.table('query_logs').update(anonymize_data).lt('created_at', anonymize_before).eq('is_anonymized', False).gt('retention_expires_at', now).execute()
-            anonymized_count = len(anonymized_result.data) if anonymized_result.data else 0
+            # Delete expired and anonymize aged logs server-side; only the counts come back
+            rpc = self.db.client.rpc('gdpr_cleanup', {
+                'p_anonymize_after': self.config.anonymize_after_days
+            })
+            result = await asyncio.to_thread(rpc.execute)
+            counts = result.data[0] if result.data else {}
+            deleted_count = counts.get('deleted', 0)
+            anonymized_count = counts.get('anonymized', 0)
             
             logger.info(f"Cleanup completed: {deleted_count} deleted, {anonymized_count} anonymized")
             return {"deleted": deleted_count, "anonymized": anonymized_count}
@@ -280,12 +472,14 @@ class QueryLogger:
     async def get_query_stats(self, days: int = 30) -> List[QueryStatsEntry]:
         """Get daily query statistics for analytics"""
         try:
-            start_date = (datetime.utcnow() - timedelta(days=days)).date().isoformat()
+            start_date = (datetime.now(timezone.utc) - timedelta(days=days)).date().isoformat()
             
-            result = self.db.client.table('daily_query_stats').select('*').gte('date', start_date).order('date', desc=True).execute()
+            query = self.read_db.client.table('daily_query_stats_view').select(STATS_SELECT).gte('date', start_date).order('date', desc=True)
+            result = await asyncio.to_thread(query.execute)
             
             if result.data:
-                return [QueryStatsEntry(**row) for row in result.data]
+                # Rows come straight from the view's typed columns, so skip re-validation
+                return [QueryStatsEntry.model_construct(**row) for row in result.data]
             else:
                 return []
                 
@@ -293,13 +487,27 @@ class QueryLogger:
             logger.error(f"Failed to get query stats: {e}")
             return []
     
+    async def rebuild_daily_stats(self, days: int = 30) -> int:
+        """
+        Recompute daily_query_stats for the last `days` days from query_logs, server-side
+        in one RPC; every date in the range is rewritten, including days with no queries
+        """
+        start_date = (datetime.now(timezone.utc) - timedelta(days=days)).date().isoformat()
+        rpc = self.db.client.rpc('rebuild_daily_stats', {'p_start': start_date})
+        result = await asyncio.to_thread(rpc.execute)
+        rebuilt_days = result.data or 0
+        
+        logger.info(f"Rebuilt daily stats for {rebuilt_days} days since {start_date}")
+        return rebuilt_days
+    
     async def get_session_data(self, session_id: str) -> Optional[QueryLogEntry]:
         """Get data for a specific session (for user data requests)"""
         try:
-            result = self.db.client.table('query_logs').select('*').eq('session_id', session_id).execute()
+            query = self.read_db.client.table('query_logs').select(SESSION_DATA_SELECT).eq('session_id', session_id).limit(1)
+            result = await asyncio.to_thread(query.execute)
             
             if result.data:
-                return QueryLogEntry(**result.data[0])
+                return QueryLogEntry.model_validate(result.data[0])
             return None
                 
         except Exception as e:
@@ -309,7 +517,8 @@ class QueryLogger:
     async def delete_session_data(self, session_id: str) -> bool:
         """Delete all data for a specific session (right to be forgotten)"""
         try:
-            result = self.db.client.table('query_logs').delete().eq('session_id', session_id).execute()
+            query = self.db.client.table('query_logs').delete().eq('session_id', session_id)
+            result = await asyncio.to_thread(query.execute)
             
             deleted = len(result.data) > 0 if result.data else False
             if deleted:
@@ -320,64 +529,101 @@ class QueryLogger:
             logger.error(f"Failed to delete session data: {e}")
             return False
     
+    @staticmethod
+    def _export_range(request: ExportRequest) -> Tuple[Optional[str], Optional[str]]:
+        """Half-open created_at range [start_date, end_date + 1 day) for an export request"""
+        start = f"{request.start_date}T00:00:00.000Z" if request.start_date else None
+        end = None
+        if request.end_date:
+            end_exclusive = (date.fromisoformat(request.end_date) + timedelta(days=1)).isoformat()
+            end = f"{end_exclusive}T00:00:00.000Z"
+        return start, end
+    
+    def _export_query(self, request: ExportRequest, snapshot_at: str):
+        """Build the filtered export query; rows newer than snapshot_at are excluded so pages don't shift"""
+        query = self.read_db.client.table('query_logs').select(EXPORT_SELECT).lte('created_at', snapshot_at)
+        
+        # Apply filters
+        if request.anonymized_only:
+            query = query.eq('is_anonymized', True)
+        
+        start, end = self._export_range(request)
+        if start:
+            query = query.gte('created_at', start)
+            
+        if end:
+            query = query.lt('created_at', end)
+            
+        if not request.include_failed_queries:
+            query = query.eq('response_status', 200)
+        
+        return query.order('created_at', desc=True).order('id')
+    
+    async def _iter_export_rows(self, request: ExportRequest, snapshot_at: str):
+        """Yield export rows page by page using .range() so only one page is held in memory"""
+        offset = 0
+        while True:
+            query = self._export_query(request, snapshot_at).range(offset, offset + EXPORT_PAGE_SIZE - 1)
+            result = await asyncio.to_thread(query.execute)
+            rows = result.data or []
+            for row in rows:
+                yield row
+            
+            if len(rows) < EXPORT_PAGE_SIZE:
+                break
+            offset += EXPORT_PAGE_SIZE
+    
     async def export_training_data(self, request: ExportRequest) -> ExportResponse:
         """Export anonymized query data for training purposes"""
         try:
-            export_id = f"export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
-            
-            # Build query for Supabase
-            query = self.db.client.table('query_logs').select(
-                'id, session_id, query_text, enhanced_query, selected_model, query_mode, '
-                'card_filter, response_status, execution_time_ms, llm_tokens_used, '
-                'llm_cost, search_results_count, created_at'
-            )
+            now = datetime.now(timezone.utc)
+            snapshot_at = now.isoformat()
+            export_id = f"export_{now.strftime('%Y%m%d_%H%M%S')}"
+            rows = self._iter_export_rows(request, snapshot_at)
             
-            # Apply filters
-            if request.anonymized_only:
-                query = query.eq('is_anonymized', True)
-                
-            if request.start_date:
-                query = query.gte('created_at', f"{request.start_date}T00:00:00.000Z")
-                
-            if request.end_date:
-                query = query.lte('created_at', f"{request.end_date}T23:59:59.999Z")
-                
-            if not request.include_failed_queries:
-                query = query.eq('response_status', 200)
-            
-            result = query.order('created_at', desc=True).execute()
-            data = result.data if result.data else []
-            
-            # Export to file (simplified - in production you might want to store in cloud storage)
-            import tempfile
-            import csv
+            # Write each page to the export file as it arrives so memory stays O(page)
+            # (simplified - in production you might want to store in cloud storage)
+            record_count = 0
             
             if request.format == "json":
-                temp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False)
-                json.dump(data, temp_file, indent=2, default=str)
-                temp_file.close()
-                file_path = temp_file.name
+                with tempfile.NamedTemporaryFile(mode='wb', suffix='.json', delete=False) as temp_file:
+                    temp_file.write(b'[')
+                    async for row in rows:
+                        temp_file.write(b',\n' if record_count else b'\n')
+                        temp_file.write(_json_bytes(row))
+                        record_count += 1
+                    temp_file.write(b'\n]\n')
+                    file_path = temp_file.name
             else:  # CSV
-                temp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False, newline='')
-                if data:
-                    writer = csv.DictWriter(temp_file, fieldnames=data[0].keys())
-                    writer.writeheader()
-                    writer.writerows(data)
-                temp_file.close()
-                file_path = temp_file.name
-            
-            # Mark records as exported (optional)
-            if data:
-                session_ids = [row['session_id'] for row in data]
-                self.db.client.table('query_logs').update({'is_exported': True}).in_('session_id', session_ids).execute()
+                with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False, newline='') as temp_file:
+                    # Plain csv.writer over itemgetter tuples skips DictWriter's per-row key checks
+                    writer = csv.writer(temp_file)
+                    writer.writerow(EXPORT_COLUMNS)
+                    async for row in rows:
+                        writer.writerow(_export_values(row))
+                        record_count += 1
+                    file_path = temp_file.name
+            
+            # Mark records as exported server-side using the export's own filters
+            if record_count:
+                start, end = self._export_range(request)
+                rpc = self.db.client.rpc('mark_exported', {
+                    'p_export_id': export_id,
+                    'p_snapshot_at': snapshot_at,
+                    'p_start': start,
+                    'p_end': end,
+                    'p_only_anon': request.anonymized_only,
+                    'p_include_failed': request.include_failed_queries
+                })
+                await asyncio.to_thread(rpc.execute)
             
             return ExportResponse(
                 export_id=export_id,
-                record_count=len(data),
+                record_count=record_count,
                 file_path=file_path,
                 gist_url=None  # TODO: Implement cloud storage upload
             )
                 
         except Exception as e:
             logger.error(f"Failed to export training data: {e}")
-            raise
\ No newline at end of file
+            raise
@@ -5,13 +5,197 @@ Supports automatic environment detection (dev/prod)
 """
 
 import os
+import atexit
+import copy
 import logging
-from typing import Optional, Dict, List, Any
-from datetime import datetime
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from typing import Optional, Dict, List, Any, Tuple
+from datetime import datetime, timedelta
+import httpx
 from supabase import create_client, Client
 
+try:
+    from supabase.lib.client_options import SyncClientOptions as ClientOptions
+except ImportError:  # supabase-py releases before the sync/async options split
+    from supabase.lib.client_options import ClientOptions
+
 logger = logging.getLogger(__name__)
 
+# HTTP connection pool for PostgREST calls, kept within Supabase's pooled connection
+# budget; bursts wait up to the timeout for a free connection instead of opening sockets
+HTTP_MAX_CONNECTIONS = 10
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 10
+HTTP_KEEPALIVE_EXPIRY = 1800  # seconds
+HTTP_TIMEOUT = 30  # seconds, also the wait for a pooled connection
+
+# Background batch writer for fire-and-forget inserts (analytics events)
+WRITE_QUEUE_MAXSIZE = 10000
+WRITE_BATCH_SIZE = 100
+WRITE_BATCH_INTERVAL = 0.5  # seconds to keep collecting rows after the first one arrives
+WRITE_FLUSH_TIMEOUT = 10  # seconds to wait for queued rows at interpreter exit
+
+# Read-through caches for preferences (in-process; refreshed on save)
+PREFERENCE_CACHE_MAXSIZE = 10000
+USER_PREFERENCE_CACHE_TTL = 120  # seconds
+SESSION_PREFERENCE_CACHE_TTL = 30  # seconds, short because sessions expire
+
+# user_preferences columns copied from the incoming preferences, with their defaults
+# (list defaults are immutable so a shared default can't be mutated between saves)
+_PREF_FIELDS = (
+    ('travel_type', None),
+    ('lounge_access', None),
+    ('fee_willingness', None),
+    ('current_cards', ()),
+    ('preferred_banks', ()),
+    ('spend_categories', ()),
+)
+
+# One client (and its HTTP keepalive pool) per (url, key), shared by every SupabaseService
+_CLIENT_CACHE: Dict[Tuple[str, str], Client] = {}
+_CLIENT_CACHE_LOCK = threading.Lock()
+
+# Shared service instance handed out by get_supabase_service()
+_service: Optional["SupabaseService"] = None
+_service_lock = threading.Lock()
+
+def _now_iso() -> str:
+    """Current UTC time as an ISO string (computed once per operation and reused)"""
+    return datetime.utcnow().isoformat()
+
+def _client_options() -> ClientOptions:
+    """Client options with an explicitly sized HTTP connection pool"""
+    try:
+        return ClientOptions(
+            postgrest_client_timeout=HTTP_TIMEOUT,
+            httpx_client=httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+                ),
+                timeout=HTTP_TIMEOUT
+            )
+        )
+    except TypeError:  # supabase-py without httpx_client injection keeps its default pool
+        logger.warning("⚠️ supabase-py does not accept a custom httpx client, using default connection pool")
+        return ClientOptions(postgrest_client_timeout=HTTP_TIMEOUT)
+
+def _get_client(supabase_url: str, supabase_key: str) -> Client:
+    """Return the cached client for this URL/key, creating it on first use"""
+    cache_key = (supabase_url, supabase_key)
+    client = _CLIENT_CACHE.get(cache_key)
+    if client is None:
+        with _CLIENT_CACHE_LOCK:
+            client = _CLIENT_CACHE.get(cache_key)
+            if client is None:
+                client = create_client(supabase_url, supabase_key, options=_client_options())
+                _CLIENT_CACHE[cache_key] = client
+    return client
+
+class _TTLCache:
+    """
+    Small bounded cache whose entries expire ttl seconds after being set. Thread-safe
+    (callers run in asyncio.to_thread workers); values are copied in and out so callers
+    can't mutate a cached entry.
+    """
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Return (hit, copy of value); expired entries count as misses"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            if entry[1] < time.monotonic():
+                del self._data[key]
+                return False, None
+            value = entry[0]
+        return True, copy.deepcopy(value)
+    
+    def set(self, key: str, value: Any):
+        entry = (copy.deepcopy(value), time.monotonic() + self.ttl)
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+class _BatchWriter:
+    """Daemon thread that drains queued (table, row) pairs and inserts them in per-table batches"""
+    
+    def __init__(self, client: Client):
+        self.client = client
+        self.queue: queue.Queue = queue.Queue(maxsize=WRITE_QUEUE_MAXSIZE)
+        self.thread = threading.Thread(target=self._run, name="supabase-batch-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+    
+    def put(self, table: str, row: Dict[str, Any]) -> bool:
+        """Queue a row without blocking; returns False if the queue is full and the row was dropped"""
+        try:
+            self.queue.put_nowait((table, row))
+            return True
+        except queue.Full:
+            logger.warning(f"⚠️ Write queue full, dropped {table} row")
+            return False
+    
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + WRITE_BATCH_INTERVAL
+            while len(batch) < WRITE_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            self._write(batch)
+    
+    def _write(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        # One timestamp per flush for rows that didn't bring their own
+        now = _now_iso()
+        rows_by_table = defaultdict(list)
+        for table, row in batch:
+            row.setdefault('created_at', now)
+            rows_by_table[table].append(row)
+        
+        for table, rows in rows_by_table.items():
+            try:
+                self.client.table(table).insert(rows).execute()
+                logger.debug("Inserted %s %s rows in one batch", len(rows), table)
+            except Exception as e:
+                logger.error(f"❌ Error batch inserting {len(rows)} {table} rows: {e}")
+        
+        for _ in batch:
+            self.queue.task_done()
+    
+    def flush(self, timeout: float = WRITE_FLUSH_TIMEOUT):
+        """Wait (up to timeout seconds) for queued rows to be written"""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+def get_supabase_service() -> "SupabaseService":
+    """Shared SupabaseService for the process (usable as a FastAPI dependency)"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = SupabaseService()
+    return _service
+
 class SupabaseService:
     def __init__(self, supabase_url: str = None, supabase_key: str = None):
         """
@@ -30,9 +214,15 @@ class SupabaseService:
             raise ValueError("SUPABASE_URL and SUPABASE_KEY must be provided via environment variables or parameters")
         
         try:
-            # Create Supabase client
-            self.client: Client = create_client(self.supabase_url, self.supabase_key)
+            # Reuse the process-wide client so connections and TLS sessions are shared
+            self.client: Client = _get_client(self.supabase_url, self.supabase_key)
             self.database_type = "supabase"
+            self._writer: Optional[_BatchWriter] = None
+            self._writer_lock = threading.Lock()
+            
+            # Preferences are read on nearly every chat turn but rarely change
+            self._user_pref_cache = _TTLCache(PREFERENCE_CACHE_MAXSIZE, USER_PREFERENCE_CACHE_TTL)
+            self._session_pref_cache = _TTLCache(PREFERENCE_CACHE_MAXSIZE, SESSION_PREFERENCE_CACHE_TTL)
             
             logger.info(f"✅ Supabase client initialized for {self.environment} environment")
             
@@ -40,11 +230,20 @@ class SupabaseService:
             logger.error(f"❌ Failed to initialize Supabase client: {e}")
             raise
     
+    @property
+    def writer(self) -> _BatchWriter:
+        """Background batch writer, started on first use"""
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = _BatchWriter(self.client)
+        return self._writer
+    
     def test_connection(self) -> bool:
         """Test Supabase connection"""
         try:
-            # Simple query to test connection
-            result = self.client.table('user_preferences').select('count', count='exact').execute()
+            # Cheapest possible round trip: fetch at most one key, no COUNT(*) over the table
+            self.client.table('user_preferences').select('user_id').limit(1).execute()
             logger.info(f"🔗 Supabase connection test successful ({self.environment})")
             return True
         except Exception as e:
@@ -55,16 +254,12 @@ class SupabaseService:
     def save_user_preferences(self, user_id: str, preferences: Dict[str, Any]) -> Dict[str, Any]:
         """Save or update user preferences"""
         try:
-            now = datetime.utcnow().isoformat()
+            now = _now_iso()
             
+            get = preferences.get
             preference_data = {
                 'user_id': user_id,
-                'travel_type': preferences.get('travel_type'),
-                'lounge_access': preferences.get('lounge_access'),
-                'fee_willingness': preferences.get('fee_willingness'),
-                'current_cards': preferences.get('current_cards', []),
-                'preferred_banks': preferences.get('preferred_banks', []),
-                'spend_categories': preferences.get('spend_categories', []),
+                **{field: get(field, default) for field, default in _PREF_FIELDS},
                 'updated_at': now
             }
             
@@ -75,7 +270,8 @@ class SupabaseService:
             ).execute()
             
             if result.data:
-                logger.info(f"✅ User preferences saved for user {user_id}")
+                self._user_pref_cache.set(user_id, result.data[0])
+                logger.debug("✅ User preferences saved for user %s", user_id)
                 return result.data[0]
             else:
                 raise Exception("No data returned from upsert operation")
@@ -86,14 +282,20 @@ class SupabaseService:
     
     def get_user_preferences(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get user preferences by user_id"""
+        hit, cached = self._user_pref_cache.get(user_id)
+        if hit:
+            return cached
+        
         try:
             result = self.client.table('user_preferences').select('*').eq('user_id', user_id).execute()
             
             if result.data:
-                logger.info(f"✅ User preferences retrieved for user {user_id}")
+                self._user_pref_cache.set(user_id, result.data[0])
+                logger.debug("✅ User preferences retrieved for user %s", user_id)
                 return result.data[0]
             else:
-                logger.info(f"ℹ️ No preferences found for user {user_id}")
+                self._user_pref_cache.set(user_id, None)
+                logger.debug("ℹ️ No preferences found for user %s", user_id)
                 return None
                 
         except Exception as e:
@@ -104,15 +306,15 @@ class SupabaseService:
     def save_session_preferences(self, session_id: str, preferences: Dict[str, Any], expires_at: datetime = None) -> str:
         """Save preferences for anonymous session"""
         try:
+            now = datetime.utcnow()
             if not expires_at:
-                from datetime import timedelta
-                expires_at = datetime.utcnow() + timedelta(days=30)
+                expires_at = now + timedelta(days=30)
             
             session_data = {
                 'session_id': session_id,
                 'preferences': preferences,
                 'expires_at': expires_at.isoformat(),
-                'created_at': datetime.utcnow().isoformat()
+                'created_at': now.isoformat()
             }
             
             result = self.client.table('session_preferences').upsert(
@@ -121,7 +323,8 @@ class SupabaseService:
             ).execute()
             
             if result.data:
-                logger.info(f"✅ Session preferences saved for session {session_id}")
+                self._session_pref_cache.set(session_id, preferences)
+                logger.debug("✅ Session preferences saved for session %s", session_id)
                 return session_id
             else:
                 raise Exception("No data returned from session preferences upsert")
@@ -132,16 +335,22 @@ class SupabaseService:
     
     def get_session_preferences(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Get preferences for anonymous session"""
+        hit, cached = self._session_pref_cache.get(session_id)
+        if hit:
+            return cached
+        
         try:
-            now = datetime.utcnow().isoformat()
+            now = _now_iso()
             
             result = self.client.table('session_preferences').select('preferences').eq('session_id', session_id).gt('expires_at', now).execute()
             
             if result.data:
-                logger.info(f"✅ Session preferences retrieved for session {session_id}")
+                self._session_pref_cache.set(session_id, result.data[0]['preferences'])
+                logger.debug("✅ Session preferences retrieved for session %s", session_id)
                 return result.data[0]['preferences']
             else:
-                logger.info(f"ℹ️ No active session preferences found for {session_id}")
+                self._session_pref_cache.set(session_id, None)
+                logger.debug("ℹ️ No active session preferences found for %s", session_id)
                 return None
                 
         except Exception as e:
@@ -152,9 +361,9 @@ class SupabaseService:
     def get_user_query_count(self, user_id: str) -> tuple[int, datetime]:
         """Get user's current query count and last reset date"""
         try:
-            today = datetime.utcnow().date().isoformat()
+            today = datetime.utcnow().date()
             
-            result = self.client.table('user_query_counts').select('*').eq('user_id', user_id).execute()
+            result = self.client.table('user_query_counts').select('query_count, last_reset_date').eq('user_id', user_id).execute()
             
             if result.data:
                 record = result.data[0]
@@ -163,21 +372,16 @@ class SupabaseService:
                 
                 if last_reset_str:
                     last_reset = datetime.fromisoformat(last_reset_str).date()
-                    # Reset count if it's a new day
-                    if last_reset.isoformat() < today:
+                    # A count from a previous day is stale; increment_query_count resets
+                    # it on the next write, so there's no need to UPDATE it here
+                    if last_reset < today:
                         query_count = 0
-                        # Update the record with reset count
-                        self.client.table('user_query_counts').update({
-                            'query_count': 0,
-                            'last_reset_date': today,
-                            'updated_at': datetime.utcnow().isoformat()
-                        }).eq('user_id', user_id).execute()
                         
                     return query_count, last_reset
                 else:
-                    return query_count, datetime.utcnow().date()
+                    return query_count, today
             else:
-                return 0, datetime.utcnow().date()
+                return 0, today
                 
         except Exception as e:
             logger.error(f"❌ Error getting user query count: {e}")
@@ -186,59 +390,34 @@ class SupabaseService:
     def increment_user_query_count(self, user_id: str, user_email: Optional[str] = None) -> int:
         """Increment user's query count and return new count"""
         try:
-            today = datetime.utcnow().date().isoformat()
-            now = datetime.utcnow().isoformat()
-            
-            # Get current count
-            current_count, last_reset = self.get_user_query_count(user_id)
-            
-            # Reset if new day
-            if last_reset.isoformat() < today:
-                current_count = 0
+            # Daily reset and increment happen atomically server-side in one round trip
+            result = self.client.rpc('increment_query_count', {
+                'p_user_id': user_id,
+                'p_email': user_email
+            }).execute()
             
-            new_count = current_count + 1
-            
-            # Upsert user query count record
-            query_data = {
-                'user_id': user_id,
-                'user_email': user_email,
-                'query_count': new_count,
-                'last_reset_date': today,
-                'updated_at': now
-            }
-            
-            result = self.client.table('user_query_counts').upsert(
-                query_data,
-                on_conflict='user_id'
-            ).execute()
-            
-            if result.data:
-                logger.info(f"✅ User query count incremented to {new_count} for user {user_id}")
-                return new_count
+            if result.data is not None:
+                # The query-limits endpoint logs the new count; no second line here
+                return result.data
             else:
-                raise Exception("No data returned from query count upsert")
+                raise Exception("No data returned from query count increment")
                 
         except Exception as e:
             logger.error(f"❌ Error incrementing user query count: {e}")
             raise
     
     # Query Logging Operations
-    def log_query(self, log_data: Dict[str, Any]) -> str:
-        """Log a query with all metadata"""
+    def log_queries_batch(self, log_rows: List[Dict[str, Any]]) -> int:
+        """Log a batch of queries with a single insert, returns the number of rows written"""
         try:
-            log_data['created_at'] = datetime.utcnow().isoformat()
-            
-            result = self.client.table('query_logs').insert(log_data).execute()
+            result = self.client.table('query_logs').insert(log_rows).execute()
             
-            if result.data:
-                log_id = result.data[0]['id']
-                logger.info(f"✅ Query logged with ID {log_id}")
-                return log_id
-            else:
-                raise Exception("No data returned from query log insert")
+            inserted = len(result.data) if result.data else 0
+            logger.debug("✅ Logged %s queries in one batch", inserted)
+            return inserted
                 
         except Exception as e:
-            logger.error(f"❌ Error logging query: {e}")
+            logger.error(f"❌ Error batch logging queries: {e}")
             raise
     
     def get_query_logs(self, user_id: str = None, limit: int = 100) -> List[Dict[str, Any]]:
@@ -252,7 +431,7 @@ class SupabaseService:
             result = query.order('created_at', desc=True).limit(limit).execute()
             
             if result.data:
-                logger.info(f"✅ Retrieved {len(result.data)} query logs")
+                logger.debug("✅ Retrieved %s query logs", len(result.data))
                 return result.data
             else:
                 return []
@@ -264,35 +443,28 @@ class SupabaseService:
     # Analytics Operations
     def log_analytics_event(self, event_type: str, user_id: str = None, session_id: str = None, 
                            event_data: Dict[str, Any] = None) -> str:
-        """Log analytics event"""
-        try:
-            analytics_data = {
-                'event_type': event_type,
-                'user_id': user_id,
-                'session_id': session_id,
-                'event_data': event_data,
-                'created_at': datetime.utcnow().isoformat()
-            }
-            
-            result = self.client.table('analytics_events').insert(analytics_data).execute()
-            
-            if result.data:
-                event_id = result.data[0]['id']
-                logger.info(f"✅ Analytics event logged: {event_type}")
-                return event_id
-            else:
-                raise Exception("No data returned from analytics insert")
-                
-        except Exception as e:
-            logger.error(f"❌ Error logging analytics event: {e}")
-            # Don't raise exception for analytics failures
+        """Queue an analytics event for the background batch writer and return its ID"""
+        event_id = str(uuid.uuid4())
+        analytics_data = {
+            'id': event_id,
+            'event_type': event_type,
+            'user_id': user_id,
+            'session_id': session_id,
+            'event_data': event_data
+        }
+        
+        # Analytics failures never propagate; a full queue just drops the event
+        if not self.writer.put('analytics_events', analytics_data):
             return None
+        
+        logger.debug("Analytics event queued: %s", event_type)
+        return event_id
     
     # Cleanup Operations
     def cleanup_expired_sessions(self) -> int:
-        """Clean up expired session preferences"""
+        """Clean up expired session preferences (manual trigger; pg_cron runs this every 10 minutes)"""
         try:
-            now = datetime.utcnow().isoformat()
+            now = _now_iso()
             
             result = self.client.table('session_preferences').delete().lt('expires_at', now).execute()
             
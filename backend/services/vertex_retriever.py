@@ -1,20 +1,182 @@
 # In src/vertex_retriever.py
 
 import os
+import asyncio
+import functools
 import time
 import json
 import logging
+import re
 import tempfile
-from typing import List, Dict, Optional
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import List, Dict, Optional, Tuple
 from google.cloud import discoveryengine
 from google.api_core import exceptions as google_exceptions
-from google.protobuf.json_format import MessageToDict
 from google.auth import default
 from google.oauth2 import service_account
 from services.card_config import get_card_config
+import numpy as np
+
+try:
+    from fastembed import TextEmbedding
+except ImportError:  # Optional: semantic search cache is disabled without it
+    TextEmbedding = None
 
 logger = logging.getLogger(__name__)
 
+# Maximum in-flight async Vertex AI searches per retriever; keeps fan-out below quota (429s)
+SEARCH_MAX_CONCURRENCY = int(os.getenv("VERTEX_SEARCH_MAX_CONCURRENCY", "20"))
+
+# Exact-match tier of the search cache, checked before the (embedding-based) semantic tier;
+# retries and repeated questions return without an RPC or an encoder pass
+SEARCH_CACHE_MAXSIZE = 1024
+SEARCH_CACHE_TTL_SECONDS = 300
+
+# Bounded memo of partial card-name matches (unmapped names come from document data,
+# so the set is small but not fixed)
+PARTIAL_MATCH_CACHE_SIZE = 1024
+
+# Search results are cached and coalesced by (query_text, card_filter, top_k, max_content_chars)
+SearchKey = Tuple[str, Optional[str], int, Optional[int]]
+
+# Semantic cache: paraphrased questions reuse results when their query embeddings are
+# this similar (cosine) and were searched with the same card filter, top_k and card
+# names mentioned in the query
+SEMANTIC_CACHE_MAXSIZE = 1024
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_MODEL = os.getenv("SEMANTIC_CACHE_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+# One gRPC search client per set of credentials, shared by every VertexRetriever in the
+# process; gRPC channels are thread-safe and multiplex concurrent RPCs
+_SEARCH_CLIENTS: Dict[object, discoveryengine.SearchServiceClient] = {}
+_SEARCH_CLIENT_LOCK = threading.Lock()
+
+# Search channel options: the transport's own defaults (unlimited message sizes) plus
+# keepalive pings, which hold the long-lived channel open between requests so a quiet
+# spell doesn't cost a fresh TCP+TLS handshake on the next search
+GRPC_CHANNEL_OPTIONS = [
+    ("grpc.max_send_message_length", -1),
+    ("grpc.max_receive_message_length", -1),
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.http2.max_pings_without_data", 0),
+]
+
+# Card-name spellings seen in the JSONL data that aren't covered by aliases in the card config
+_KNOWN_CARD_VARIANTS = {
+    "ICICI EPM": (
+        "Emeralde Private Metal Credit Card",
+        "ICICI Bank Emeralde Private Metal Credit Card",
+        "emeralde private metal",
+        "EPM",
+    ),
+    "Axis Atlas": ("Axis Atlas Credit Card", "Axis Bank Atlas Credit Card", "atlas"),
+    "HSBC Premier": ("HSBC Premier Credit Card", "premier", "hsbc"),
+    "HDFC Infinia": ("HDFC Infinia Credit Card", "infinia", "hdfc"),
+}
+
+@functools.lru_cache(maxsize=1)
+def _load_credentials(creds_json: Optional[str], creds_file: Optional[str]):
+    """
+    Get Google Cloud credentials from the given environment values or default. Cached,
+    so later retrievers skip re-parsing the JSON and re-loading the private key; failures
+    raise instead, so they aren't cached and the next retriever tries again.
+    """
+    # Check if we have JSON credentials in environment variable
+    if creds_json:
+        logger.info("Using GOOGLE_APPLICATION_CREDENTIALS_JSON from environment")
+        # Parse the JSON credentials
+        creds_info = json.loads(creds_json)
+        credentials = service_account.Credentials.from_service_account_info(creds_info)
+        return credentials
+    
+    # Check if GOOGLE_APPLICATION_CREDENTIALS file path is set
+    if creds_file and os.path.exists(creds_file):
+        logger.info(f"Using GOOGLE_APPLICATION_CREDENTIALS file: {creds_file}")
+        credentials = service_account.Credentials.from_service_account_file(creds_file)
+        return credentials
+    
+    # Try default credentials (local development)
+    logger.info("Attempting to use default credentials")
+    credentials, _ = default()
+    return credentials
+
+
+def _search_transport(credentials, transport_name: str):
+    """Search transport on a gRPC channel we build ourselves, with keepalive enabled."""
+    transport_cls = discoveryengine.SearchServiceClient.get_transport_class(transport_name)
+    host = discoveryengine.SearchServiceClient.DEFAULT_ENDPOINT
+    channel = transport_cls.create_channel(
+        f"{host}:443",
+        credentials=credentials or None,
+        options=GRPC_CHANNEL_OPTIONS,
+    )
+    # A transport given a channel ignores credentials; they are already on the channel
+    return transport_cls(host=host, channel=channel)
+
+
+class _SemanticCache:
+    """Results of earlier searches, looked up by embedding similarity of the query text"""
+    
+    def __init__(self, model, maxsize: int, threshold: float, ttl: float):
+        self.model = model
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._emb: Optional[np.ndarray] = None  # [maxsize, dim], allocated on first put
+        self._size = 0  # slots [0, _size) are filled; empty slots are always used first, in order
+        self._key_ids = np.full(maxsize, -1, dtype=np.int64)  # -1 marks an empty slot
+        self._expires = np.zeros(maxsize, dtype=np.float64)
+        self._last_used = np.zeros(maxsize, dtype=np.float64)
+        self._values: List[Optional[tuple]] = [None] * maxsize
+        self._key_index: Dict[Tuple, int] = {}
+    
+    def embed(self, text: str) -> np.ndarray:
+        """L2-normalized embedding of the query (CPU-bound; call off the event loop)."""
+        vector = np.asarray(next(iter(self.model.embed([text]))), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def get(self, embedding: np.ndarray, scope: Tuple) -> Optional[tuple]:
+        """Return cached results for the most similar live query with the same scope, if close enough."""
+        with self._lock:
+            key_id = self._key_index.get(scope)
+            if key_id is None or self._emb is None:
+                return None
+            now = time.monotonic()
+            size = self._size
+            # One matrix-vector product over the filled rows only (BLAS sgemv)
+            sims = self._emb[:size] @ embedding
+            # Only entries searched with the same scope that haven't expired
+            sims[(self._key_ids[:size] != key_id) | (self._expires[:size] < now)] = -1.0
+            slot = int(np.argmax(sims))
+            if sims[slot] < self.threshold:
+                return None
+            self._last_used[slot] = now
+            return self._values[slot]
+    
+    def put(self, embedding: np.ndarray, scope: Tuple, value: tuple):
+        with self._lock:
+            if self._emb is None:
+                self._emb = np.zeros((self.maxsize, embedding.shape[0]), dtype=np.float32)
+            key_id = self._key_index.setdefault(scope, len(self._key_index))
+            # Fill the next empty slot, otherwise evict the least recently used entry
+            if self._size < self.maxsize:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+            now = time.monotonic()
+            self._emb[slot] = embedding
+            self._key_ids[slot] = key_id
+            self._expires[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self._values[slot] = value
+
+
 class VertexRetriever:
     """
     (Simplified & Corrected) Vertex AI Search retriever.
@@ -27,13 +189,34 @@ class VertexRetriever:
         
         # Get card configuration service
         self.card_config = get_card_config()
+        # Card name lookups are fixed for the life of the retriever; build them once
+        self._card_name_mapping = self._build_card_name_mapping()
+        self._expected_cards = frozenset(self.card_config.get_display_names())
+        # Case-folded once for case-insensitive lookups; the first spelling of a name wins
+        self._card_name_mapping_cf: Dict[str, str] = {}
+        for mapping_key, mapped_value in self._card_name_mapping.items():
+            self._card_name_mapping_cf.setdefault(mapping_key.casefold(), mapped_value)
+        # Partial matching of unmapped names scans these; recent results are memoized per name
+        self._casefolded_card_names = tuple(self._card_name_mapping_cf.items())
+        self._partial_card_match = functools.lru_cache(maxsize=PARTIAL_MATCH_CACHE_SIZE)(self._find_partial_card_match)
+        # Whole-word card names in query text, longest first ("axis atlas" before "atlas")
+        self._card_mention_re = re.compile(r'\b(?:%s)\b' % '|'.join(
+            re.escape(name_cf) for name_cf in sorted(self._card_name_mapping_cf, key=len, reverse=True) if name_cf
+        ))
         
-        # Set up authentication
-        credentials = self._get_credentials()
-        if credentials:
-            self.client = discoveryengine.SearchServiceClient(credentials=credentials)
-        else:
-            self.client = discoveryengine.SearchServiceClient()
+        # Set up authentication; the gRPC client and credentials are shared process-wide
+        self.client, self._credentials = self._get_search_client()
+        # SearchKey -> (results tuple, expiry)
+        self._search_cache: "OrderedDict[SearchKey, Tuple[tuple, float]]" = OrderedDict()
+        self._search_cache_lock = threading.Lock()
+        self._semantic_cache = self._init_semantic_cache()
+        # In-flight searches by cache key, so concurrent duplicates on one event loop share one RPC
+        self._ainflight: Dict[SearchKey, asyncio.Future] = {}
+        # Async clients and concurrency limits are created lazily per event loop (grpc.aio
+        # channels and semaphores are bound to one loop): the serving loop keeps its own,
+        # while sync callers' short-lived loops close theirs when done
+        self._async_clients: Dict[asyncio.AbstractEventLoop, discoveryengine.SearchServiceAsyncClient] = {}
+        self._search_semaphores: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
             
         self.serving_config = self.client.serving_config_path(
             project=project_id,
@@ -41,274 +224,377 @@ class VertexRetriever:
             data_store=data_store_id,
             serving_config="default_config",
         )
+        # Explicitly request document content; identical for every search, so build it once
+        self._content_spec = discoveryengine.SearchRequest.ContentSearchSpec(
+            snippet_spec=discoveryengine.SearchRequest.ContentSearchSpec.SnippetSpec(
+                return_snippet=True,
+                max_snippet_count=3
+            ),
+            extractive_content_spec=discoveryengine.SearchRequest.ContentSearchSpec.ExtractiveContentSpec(
+                max_extractive_answer_count=3,
+                max_extractive_segment_count=3
+            )
+        )
+        # Everything but query and page_size is fixed; each search copies this prototype
+        self._request_proto = discoveryengine.SearchRequest(
+            serving_config=self.serving_config,
+            # filter=filter_str  # Disabled until data store update
+            content_search_spec=self._content_spec
+        )
         logger.info(f"Vertex AI Search client initialized for project: {project_id}")
 
-    def _get_credentials(self):
-        """Get Google Cloud credentials from environment variables or default."""
-        try:
-            # Check if we have JSON credentials in environment variable
-            creds_json = os.getenv('GOOGLE_APPLICATION_CREDENTIALS_JSON')
-            if creds_json:
-                logger.info("Using GOOGLE_APPLICATION_CREDENTIALS_JSON from environment")
-                # Parse the JSON credentials
-                creds_info = json.loads(creds_json)
-                credentials = service_account.Credentials.from_service_account_info(creds_info)
-                return credentials
+    def _build_card_name_mapping(self) -> MappingProxyType:
+        """Map every known card name variation to its display name."""
+        # Get card name mapping from centralized configuration
+        card_name_mapping = self.card_config.get_card_name_mapping()
+        
+        # Add comprehensive mappings for variations in card names
+        for card in self.card_config.get_all_active_cards():
+            display_name = card["display_name"]
             
-            # Check if GOOGLE_APPLICATION_CREDENTIALS file path is set
-            creds_file = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
-            if creds_file and os.path.exists(creds_file):
-                logger.info(f"Using GOOGLE_APPLICATION_CREDENTIALS file: {creds_file}")
-                credentials = service_account.Credentials.from_service_account_file(creds_file)
-                return credentials
+            # Map display name to itself
+            card_name_mapping[display_name] = display_name
             
-            # Try default credentials (local development)
-            logger.info("Attempting to use default credentials")
-            credentials, _ = default()
-            return credentials
+            # Map all aliases to display name (lookups are case-insensitive, so no
+            # Title/UPPER copies are needed)
+            card_name_mapping.update(dict.fromkeys(card.get("aliases", ()), display_name))
             
+            # Map short name and bank combinations
+            if "short_name" in card:
+                card_name_mapping[card["short_name"]] = display_name
+            
+            # Map full name variations
+            card_name_mapping[card["full_name"]] = display_name
+            
+            # Handle specific known variations from JSONL data
+            for variant in _KNOWN_CARD_VARIANTS.get(display_name, ()):
+                card_name_mapping[variant] = display_name
+        
+        logger.info(f"🔧 [MAPPING] Built card name mapping with {len(card_name_mapping)} entries")
+        return MappingProxyType(card_name_mapping)
+
+    def _init_semantic_cache(self) -> Optional[_SemanticCache]:
+        """Load the embedding model for the semantic cache; None if it is unavailable."""
+        if TextEmbedding is None:
+            logger.info("Semantic search cache disabled (fastembed not installed)")
+            return None
+        try:
+            model = TextEmbedding(model_name=SEMANTIC_CACHE_MODEL)
         except Exception as e:
-            logger.warning(f"Failed to load credentials: {e}")
-            # Return None to let the client try default auth
+            logger.warning(f"Semantic search cache disabled, failed to load {SEMANTIC_CACHE_MODEL}: {e}")
             return None
+        logger.info(f"Semantic search cache enabled ({SEMANTIC_CACHE_MODEL}, threshold {SEMANTIC_CACHE_THRESHOLD})")
+        return _SemanticCache(model, SEMANTIC_CACHE_MAXSIZE, SEMANTIC_CACHE_THRESHOLD, SEARCH_CACHE_TTL_SECONDS)
 
-    def search_similar_documents(self, query_text: str, card_filter: Optional[str] = None, top_k: int = 10, use_mmr: bool = False) -> List[Dict]:
-        """Performs a search with precise metadata filtering."""
-        # Note: use_mmr is ignored for Vertex AI Search (ChromaDB-specific parameter)
-        
+    def _get_search_client(self) -> Tuple[discoveryengine.SearchServiceClient, object]:
+        """Return the shared search client and credentials, creating the client on first use."""
+        try:
+            credentials = _load_credentials(
+                os.getenv('GOOGLE_APPLICATION_CREDENTIALS_JSON'),
+                os.getenv('GOOGLE_APPLICATION_CREDENTIALS'),
+            )
+        except Exception as e:
+            logger.warning(f"Failed to load credentials: {e}")
+            # None lets the client try default auth
+            credentials = None
+        client = _SEARCH_CLIENTS.get(credentials)
+        if client is None:
+            with _SEARCH_CLIENT_LOCK:
+                client = _SEARCH_CLIENTS.get(credentials)
+                if client is None:
+                    client = discoveryengine.SearchServiceClient(
+                        transport=_search_transport(credentials, "grpc")
+                    )
+                    _SEARCH_CLIENTS[credentials] = client
+        return client, credentials
+
+    def _build_search_request(self, query_text: str, card_filter: Optional[str], top_k: int) -> discoveryengine.SearchRequest:
+        """Build the SearchRequest for one search."""
         # With document-level aliases, we can rely on natural search matching
         # No need for hardcoded card name mappings anymore
         enhanced_query = query_text
         
         # For card filtering, simply add the card name to the query
         if card_filter:
-            logger.info(f"Adding card filter '{card_filter}' to query")
             enhanced_query = f"{card_filter} {enhanced_query}"
             
         # Note: Query enhancement is now handled by QueryEnhancer service
         # Vertex retriever focuses on search execution only
         
-        logger.info(f"🔍 [SEARCH_DEBUG] === VERTEX AI SEARCH REQUEST ===")
-        logger.info(f"🔍 [SEARCH_DEBUG] Original query: '{query_text}'")
-        logger.info(f"🔍 [SEARCH_DEBUG] Enhanced query: '{enhanced_query}'")
-        logger.info(f"🔍 [SEARCH_DEBUG] Card filter: {card_filter}")
-        logger.info(f"🔍 [SEARCH_DEBUG] Top-k: {top_k}")
-        # Get expected cards from configuration
-        expected_cards = self.card_config.get_display_names()
-        logger.info(f"🔍 [SEARCH_DEBUG] Expecting {len(expected_cards)} cards: {', '.join(expected_cards)}")
+        # One summary line per search; the detailed request dump is DEBUG-only
+        logger.info("🔍 [SEARCH] query=%r card_filter=%s top_k=%s", enhanced_query, card_filter, top_k)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🔍 [SEARCH_DEBUG] Original query: %r", query_text)
+            logger.debug("🔍 [SEARCH_DEBUG] Expecting %s cards: %s",
+                         len(self._expected_cards), ', '.join(sorted(self._expected_cards)))
         
-        request = discoveryengine.SearchRequest(
-            serving_config=self.serving_config,
-            query=enhanced_query,
-            page_size=top_k,
-            # filter=filter_str  # Disabled until data store update
-            # Explicitly request document content
-            content_search_spec=discoveryengine.SearchRequest.ContentSearchSpec(
-                snippet_spec=discoveryengine.SearchRequest.ContentSearchSpec.SnippetSpec(
-                    return_snippet=True,
-                    max_snippet_count=3
-                ),
-                extractive_content_spec=discoveryengine.SearchRequest.ContentSearchSpec.ExtractiveContentSpec(
-                    max_extractive_answer_count=3,
-                    max_extractive_segment_count=3
-                )
-            )
-        )
+        # One C-level CopyFrom of the prototype instead of re-wrapping each field
+        request = discoveryengine.SearchRequest()
+        discoveryengine.SearchRequest.copy_from(request, self._request_proto)
+        request.query = enhanced_query
+        request.page_size = top_k
+        return request
+
+    def search_similar_documents(self, query_text: str, card_filter: Optional[str] = None, top_k: int = 10, use_mmr: bool = False,
+                                 max_content_chars: Optional[int] = None) -> List[Dict]:
+        """
+        Sync variant of asearch_similar_documents for callers without an event loop
+        (scripts, tests); it runs the async search on a loop of its own via asyncio.run.
+        """
+        self._require_no_running_loop("search_similar_documents", "asearch_similar_documents")
+        return asyncio.run(self._run_on_own_loop(
+            self.asearch_similar_documents(query_text, card_filter, top_k, use_mmr, max_content_chars)
+        ))
+
+    async def asearch_similar_documents(self, query_text: str, card_filter: Optional[str] = None, top_k: int = 10, use_mmr: bool = False,
+                                        max_content_chars: Optional[int] = None) -> List[Dict]:
+        """
+        Performs a search with the async search client. With max_content_chars, each
+        document's content stops being decoded at that length (for callers that only build
+        LLM context; displayed sources need the full text).
+        """
+        # Note: use_mmr is ignored for Vertex AI Search (ChromaDB-specific parameter)
+        cache_key = (query_text, card_filter, top_k, max_content_chars)
+        cached = self._get_cached_results(cache_key)
+        if cached is not None:
+            return cached
         
+        # Single-flight: concurrent identical misses await the first caller's search
+        # (a future can only be awaited on the loop that created it)
+        loop = asyncio.get_running_loop()
+        inflight = self._ainflight.get(cache_key)
+        if inflight is not None and inflight.get_loop() is loop:
+            await asyncio.wait({inflight})
+            if not inflight.cancelled():
+                return [dict(doc) for doc in inflight.result()]
+            # The leader was cancelled or failed; search independently
+            return await self._asearch_uncached(cache_key)
+        
+        inflight = loop.create_future()
+        self._ainflight[cache_key] = inflight
         try:
-            response = self.client.search(request)
-            results = self._process_response(response)
-            
+            results = await self._asearch_uncached(cache_key)
+        except BaseException:
+            inflight.cancel()
+            raise
+        else:
+            inflight.set_result(tuple(dict(doc) for doc in results))
+            return results
+        finally:
+            if self._ainflight.get(cache_key) is inflight:
+                del self._ainflight[cache_key]
+
+    async def search_cards(self, query_text: str, card_filters: List[str], top_k: int = 10,
+                           max_content_chars: Optional[int] = None) -> List[List[Dict]]:
+        """Search several card filters concurrently; results are in card_filters order."""
+        return await self.search_many([(query_text, card_filter) for card_filter in card_filters], top_k, max_content_chars)
+
+    async def search_many(self, queries: List[Tuple[str, Optional[str]]], top_k: int = 10,
+                          max_content_chars: Optional[int] = None) -> List[List[Dict]]:
+        """Run (query_text, card_filter) searches concurrently; results are in queries order."""
+        return await asyncio.gather(*[
+            self.asearch_similar_documents(query_text, card_filter, top_k, max_content_chars=max_content_chars)
+            for query_text, card_filter in queries
+        ])
+
+    def search_batch(self, queries: List[Tuple[str, Optional[str]]], top_k: int = 10,
+                     max_content_chars: Optional[int] = None) -> List[List[Dict]]:
+        """Sync variant of search_many for callers without an event loop; one asyncio.run for the whole batch."""
+        self._require_no_running_loop("search_batch", "search_many")
+        return asyncio.run(self._run_on_own_loop(self.search_many(queries, top_k, max_content_chars)))
+
+    async def _asearch_uncached(self, cache_key: SearchKey) -> List[Dict]:
+        """Async semantic cache lookup, then the Vertex RPC; successful results are cached."""
+        query_text, card_filter, top_k, max_content_chars = cache_key
+        embedding = None
+        if self._semantic_cache is not None:
+            embedding = await asyncio.to_thread(self._semantic_cache.embed, query_text)
+            cached = self._get_semantic_results(cache_key, embedding)
+            if cached is not None:
+                return cached
+        
+        request = self._build_search_request(query_text, card_filter, top_k)
+        
+        try:
+            async with self._get_search_semaphore():
+                response = await self._get_async_client().search(request)
+            results = self._process_response(response, max_content_chars)
+            self._cache_results(cache_key, results, embedding)
             return results
             
         except google_exceptions.GoogleAPIError as e:
             logger.error(f"Vertex AI Search API error: {e}")
             return self._fallback_response(query_text)
 
-    def _process_response(self, response: discoveryengine.SearchResponse) -> List[Dict]:
+    def _get_cached_results(self, key: SearchKey) -> Optional[List[Dict]]:
+        """Return a fresh copy of cached results, or None on a miss or expired entry."""
+        with self._search_cache_lock:
+            entry = self._search_cache.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._search_cache[key]
+                return None
+            self._search_cache.move_to_end(key)
+        logger.info("🔍 [SEARCH_CACHE] Hit for query: %r", key[0][:100])
+        # Copy so callers can't mutate the cached documents
+        return [dict(doc) for doc in entry[0]]
+
+    def _semantic_scope(self, key: SearchKey) -> Tuple:
+        """
+        What a semantic hit must share with the query besides similar wording: the card
+        filter, top_k and the cards the query names. "HDFC Infinia lounge access" and
+        "Axis Atlas lounge access" embed almost identically but need different results.
+        """
+        query_text, card_filter, top_k, max_content_chars = key
+        return card_filter, top_k, max_content_chars, frozenset(self.cards_mentioned(query_text))
+
+    def cards_mentioned(self, text: str) -> List[str]:
+        """Display names of the cards text names (by any known alias), in order of first mention."""
+        return list(dict.fromkeys(
+            self._card_name_mapping_cf[name_cf]
+            for name_cf in self._card_mention_re.findall(text.casefold()) if name_cf
+        ))
+
+    def _get_semantic_results(self, key: SearchKey, embedding: np.ndarray) -> Optional[List[Dict]]:
+        """Return a copy of results cached for a paraphrase of this query, or None."""
+        cached = self._semantic_cache.get(embedding, self._semantic_scope(key))
+        if cached is None:
+            return None
+        logger.info("🔍 [SEARCH_CACHE] Semantic hit")
+        # Promote to the exact tier so a repeat of this exact query skips the encoder
+        self._put_exact(key, cached)
+        return [dict(doc) for doc in cached]
+
+    def _cache_results(self, key: SearchKey, results: List[Dict], embedding: Optional[np.ndarray] = None):
+        """Cache processed results (fallback responses never reach here)."""
+        docs = tuple(dict(doc) for doc in results)
+        if embedding is not None:
+            self._semantic_cache.put(embedding, self._semantic_scope(key), docs)
+        self._put_exact(key, docs)
+
+    def _put_exact(self, key: SearchKey, docs: tuple):
+        """Store results in the exact-match tier, evicting the least recently used entry."""
+        entry = (docs, time.monotonic() + SEARCH_CACHE_TTL_SECONDS)
+        with self._search_cache_lock:
+            self._search_cache[key] = entry
+            self._search_cache.move_to_end(key)
+            if len(self._search_cache) > SEARCH_CACHE_MAXSIZE:
+                self._search_cache.popitem(last=False)
+
+    @staticmethod
+    def _require_no_running_loop(method: str, async_method: str):
+        """Sync wrappers can't start a nested event loop; point async callers at the async API."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        raise RuntimeError(f"{method}() can't be called from a running event loop; await {async_method}() instead")
+
+    async def _run_on_own_loop(self, coro):
+        """Await coro on a sync caller's short-lived loop, then close the client it created there."""
+        try:
+            return await coro
+        finally:
+            loop = asyncio.get_running_loop()
+            self._search_semaphores.pop(loop, None)
+            client = self._async_clients.pop(loop, None)
+            if client is not None:
+                await client.transport.close()
+
+    def _get_search_semaphore(self) -> asyncio.Semaphore:
+        """Limit concurrent async searches (per event loop) so fan-out stays under the Vertex AI quota."""
+        loop = asyncio.get_running_loop()
+        semaphore = self._search_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._search_semaphores[loop] = asyncio.Semaphore(SEARCH_MAX_CONCURRENCY)
+        return semaphore
+
+    def _get_async_client(self) -> discoveryengine.SearchServiceAsyncClient:
+        """The async search client for the running event loop, created there on first use."""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = self._create_async_client()
+        return client
+
+    def _create_async_client(self) -> discoveryengine.SearchServiceAsyncClient:
+        return discoveryengine.SearchServiceAsyncClient(
+            transport=_search_transport(self._credentials, "grpc_asyncio")
+        )
+
+    def _process_response(self, response: discoveryengine.SearchResponse, max_content_chars: Optional[int] = None) -> List[Dict]:
         """(Simplified & Corrected) Processes the search response."""
-        processed_results = []
-        
-        logger.info(f"=== DEBUGGING VERTEX AI RESPONSE ===")
-        logger.info(f"Total results: {len(response.results)}")
+        # Per-result diagnostics are DEBUG-only; production INFO skips building them
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("=== DEBUGGING VERTEX AI RESPONSE ===")
+            logger.debug("Total results: %s", len(response.results))
         
         # Track card coverage for debugging missing cards issue
         cards_found = set()
-        # Get card name mapping from centralized configuration
-        card_name_mapping = self.card_config.get_card_name_mapping()
-        
-        # Add comprehensive mappings for variations in card names
-        for card in self.card_config.get_all_active_cards():
-            display_name = card["display_name"]
-            
-            # Map display name to itself
-            card_name_mapping[display_name] = display_name
-            
-            # Map all aliases to display name
-            for alias in card.get("aliases", []):
-                card_name_mapping[alias] = display_name
-                card_name_mapping[alias.title()] = display_name  # Title case
-                card_name_mapping[alias.upper()] = display_name  # Upper case
-            
-            # Map short name and bank combinations
-            if "short_name" in card:
-                card_name_mapping[card["short_name"]] = display_name
-            
-            # Map full name variations
-            full_name = card["full_name"]
-            card_name_mapping[full_name] = display_name
-            
-            # Handle specific known variations from JSONL data
-            if display_name == "ICICI EPM":
-                card_name_mapping["Emeralde Private Metal Credit Card"] = display_name
-                card_name_mapping["ICICI Bank Emeralde Private Metal Credit Card"] = display_name
-                card_name_mapping["emeralde private metal"] = display_name
-                card_name_mapping["EPM"] = display_name
-            elif display_name == "Axis Atlas":
-                card_name_mapping["Axis Atlas Credit Card"] = display_name
-                card_name_mapping["Axis Bank Atlas Credit Card"] = display_name
-                card_name_mapping["atlas"] = display_name
-            elif display_name == "HSBC Premier":
-                card_name_mapping["HSBC Premier Credit Card"] = display_name
-                card_name_mapping["premier"] = display_name
-                card_name_mapping["hsbc"] = display_name
-            elif display_name == "HDFC Infinia":
-                card_name_mapping["HDFC Infinia Credit Card"] = display_name
-                card_name_mapping["infinia"] = display_name
-                card_name_mapping["hdfc"] = display_name
+        processed_results = list(self._iter_processed_response(response, cards_found, max_content_chars))
         
-        logger.info(f"🔧 [MAPPING] Built card name mapping with {len(card_name_mapping)} entries")
-        logger.info(f"🔧 [MAPPING] Sample mappings: {dict(list(card_name_mapping.items())[:5])}")
+        # Card coverage analysis - critical for debugging missing card issue. One record per
+        # search, with the fields also attached as `coverage` for structured log handlers.
+        if logger.isEnabledFor(logging.INFO):
+            all_expected_cards = self._expected_cards
+            coverage = {
+                "found": sorted(cards_found),
+                "missing": sorted(all_expected_cards - cards_found),
+                "ratio": len(cards_found) / len(all_expected_cards) if all_expected_cards else 1.0,
+            }
+            logger.info("🎯 [COVERAGE] Processed %s documents covering %s/%s cards, missing: %s",
+                        len(processed_results), len(cards_found), len(all_expected_cards),
+                        coverage["missing"] or "none", extra={"coverage": coverage})
+        return processed_results
+
+    def _iter_processed_response(self, response: discoveryengine.SearchResponse, cards_found: Optional[set] = None,
+                                 max_content_chars: Optional[int] = None):
+        """
+        Yield one result dict per search result, decoding each lazily so a caller that
+        stops early skips the rest. Display names of recognised cards go into cards_found.
+        """
+        debug = logger.isEnabledFor(logging.DEBUG)
+        card_name_mapping = self._card_name_mapping
+        card_name_mapping_cf = self._card_name_mapping_cf
         
         for i, result in enumerate(response.results):
-            logger.info(f"\n--- RESULT {i+1} ---")
-            
-            # Convert the complex result object into a simple dictionary
-            result_dict = MessageToDict(result._pb)
-            logger.info(f"Result dict keys: {list(result_dict.keys())}")
-            
-            # Extract the data cleanly and directly
-            document = result_dict.get('document', {})
-            logger.info(f"Document keys: {list(document.keys())}")
-            
-            struct_data = document.get('structData', {})
-            logger.info(f"Struct data: {struct_data}")
-            
-            # Also check derivedStructData
-            derived_struct_data = document.get('derivedStructData', {})
-            logger.info(f"Derived struct data keys: {list(derived_struct_data.keys())}")
-            # logger.info(f"Derived struct data: {derived_struct_data}")
+            # Read fields straight off the protobuf message instead of converting
+            # the whole result to a dict (and base64-encoding raw bytes) first
+            document = result._pb.document
+            struct_fields = document.struct_data.fields
+            derived_fields = document.derived_struct_data.fields
+            if debug:
+                logger.debug("--- RESULT %s --- struct keys: %s, derived keys: %s",
+                             i + 1, list(struct_fields.keys()), list(derived_fields.keys()))
             
-            # Handle both text and raw_bytes content formats
-            content_obj = document.get('content', {})
-            # logger.info(f"Content object keys: {list(content_obj.keys())}")
-            # logger.info(f"Content object: {content_obj}")
-            
-            content = ''
-            
-            # Priority 1: Check document.content for raw content
-            if 'text' in content_obj:
-                content = content_obj['text']
-                logger.info(f"Found 'text' field, length: {len(content)}")
-                logger.info(f"Text content preview: {content[:200]}...")
-            elif 'rawBytes' in content_obj:
-                # Decode Base64 content
-                import base64
-                try:
-                    raw_bytes = content_obj['rawBytes']
-                    logger.info(f"Found 'rawBytes' field, length: {len(raw_bytes)}")
-                    content_bytes = base64.b64decode(raw_bytes)
-                    content = content_bytes.decode('utf-8')
-                    logger.info(f"Successfully decoded Base64, content length: {len(content)}")
-                    logger.info(f"Decoded content preview: {content[:200]}...")
-                except Exception as e:
-                    logger.error(f"Failed to decode Base64 content: {e}")
-                    content = "Content decoding failed"
-                    
-            # Priority 2: If no raw content, extract from Vertex AI's processed fields
-            if not content and derived_struct_data:
-                logger.info(f"No raw content found, extracting from derivedStructData...")
-                
-                # Collect all available content from multiple sources
-                all_content_parts = []
-                
-                # Extract from extractive_segments (most complete)
-                if 'extractive_segments' in derived_struct_data:
-                    segments = derived_struct_data['extractive_segments']
-                    if segments and isinstance(segments, list):
-                        for segment in segments:
-                            if isinstance(segment, dict) and 'content' in segment:
-                                all_content_parts.append(segment['content'])
-                        logger.info(f"Extracted {len(all_content_parts)} segments from extractive_segments")
-                
-                # ALSO extract from extractive_answers (contains specific information like golf benefits)
-                if 'extractive_answers' in derived_struct_data:
-                    answers = derived_struct_data['extractive_answers']
-                    if answers and isinstance(answers, list):
-                        for answer in answers:
-                            if isinstance(answer, dict) and 'content' in answer:
-                                # Only add if not already present to avoid duplicates
-                                answer_content = answer['content']
-                                if answer_content not in all_content_parts:
-                                    all_content_parts.append(answer_content)
-                        logger.info(f"Added {len([a for a in answers if isinstance(a, dict) and 'content' in a])} answers from extractive_answers")
-                
-                # Combine all content parts
-                if all_content_parts:
-                    content = '\n\n'.join(all_content_parts)
-                    logger.info(f"Combined content from multiple sources, total length: {len(content)}")
-                    logger.info(f"Combined content preview: {content[:200]}...")
-                    
+            content = self._extract_content(document.content, derived_fields, max_content_chars)
             
             if not content:
-                logger.warning(f"No content found in any field!")
-                logger.info(f"Available content fields: {list(content_obj.keys())}")
-                logger.info(f"Available derived fields: {list(derived_struct_data.keys())}")
+                logger.warning("No content found in any field!")
             
-            card_name = struct_data.get('cardName', 'Unknown Card')
-            section = struct_data.get('section', 'details')
+            card_name = struct_fields['cardName'].string_value if 'cardName' in struct_fields else 'Unknown Card'
+            section = struct_fields['section'].string_value if 'section' in struct_fields else 'details'
             
             # Track which cards are found for coverage analysis
-            logger.info(f"🔍 [CARD_EXTRACTION] Raw card name from search: '{card_name}'")
-            
-            if card_name in card_name_mapping:
-                mapped_name = card_name_mapping[card_name]
-                cards_found.add(mapped_name)
-                logger.info(f"✅ [CARD_TRACKING] Mapped '{card_name}' → '{mapped_name}'")
-            elif card_name != 'Unknown Card':
-                logger.warning(f"⚠️ [CARD_TRACKING] Found unmapped card: '{card_name}'")
+            mapped_value = card_name_mapping.get(card_name) or card_name_mapping_cf.get(card_name.casefold())
+            if mapped_value is None and card_name != 'Unknown Card':
+                logger.warning("⚠️ [CARD_TRACKING] Found unmapped card: '%s'", card_name)
                 # Try partial matching with aliases
-                for mapping_key, mapped_value in card_name_mapping.items():
-                    if card_name.lower() in mapping_key.lower() or mapping_key.lower() in card_name.lower():
-                        cards_found.add(mapped_value)
-                        logger.info(f"🔧 [CARD_TRACKING] Partial match: '{card_name}' → '{mapped_value}' via '{mapping_key}'")
-                        break
+                mapped_value = self._partial_card_match(card_name)
+            if mapped_value is not None and cards_found is not None:
+                cards_found.add(mapped_value)
             
-            logger.info(f"Final extracted: cardName='{card_name}', section='{section}', content_length={len(content)}")
+            if debug:
+                logger.debug("Final extracted: cardName='%s', section='%s', content_length=%s, preview: %s...",
+                             card_name, section, len(content), content[:200])
             
-            processed_results.append({
+            yield {
                 'content': content,
                 'cardName': card_name,
                 'section': section,
-                'similarity': result_dict.get('relevanceScore', 0.8),
-            })
-        
-        # Card coverage analysis - critical for debugging missing card issue
-        all_expected_cards = set(self.card_config.get_display_names())
-        missing_cards = all_expected_cards - cards_found
-        
-        logger.info(f"=== CARD COVERAGE ANALYSIS ===")
-        logger.info(f"🎯 [COVERAGE] Cards found in results: {sorted(list(cards_found))}")
-        if missing_cards:
-            logger.warning(f"❌ [COVERAGE] Missing cards: {sorted(list(missing_cards))}")
-            logger.warning(f"🚨 [COVERAGE] CRITICAL: ICICI EPM missing from search results!" if 'ICICI EPM' in missing_cards else "")
-        else:
-            logger.info(f"✅ [COVERAGE] All 4 cards present in search results!")
-        logger.info(f"📊 [COVERAGE] Card coverage: {len(cards_found)}/4 cards ({len(cards_found)/4*100:.1f}%)")
-        
-        logger.info(f"=== END DEBUGGING ===")
-        logger.info(f"Successfully processed {len(processed_results)} documents.")
-        return processed_results
+                'similarity': 0.8,  # SearchResult carries no relevance score
+            }
         
     # def get_available_cards(self) -> List[str]:
     #     """Returns the list of available credit cards."""
@@ -320,6 +606,64 @@ class VertexRetriever:
 
     
 
+    def _find_partial_card_match(self, card_name: str) -> Optional[str]:
+        """Display name of the first mapping key that contains, or is contained in, card_name."""
+        name_cf = card_name.casefold()
+        mapped = next(
+            (value for key_cf, value in self._casefolded_card_names
+             if name_cf in key_cf or key_cf in name_cf),
+            None
+        )
+        if mapped is not None:
+            logger.debug("🔧 [CARD_TRACKING] Partial match: '%s' → '%s'", card_name, mapped)
+        return mapped
+
+    @classmethod
+    def _extract_content(cls, content_msg, derived_fields, max_chars: Optional[int] = None) -> str:
+        """Document text (up to max_chars, if given): raw content if stored, else Vertex's extractive segments and answers."""
+        # Priority 1: Check document.content for raw content
+        if content_msg.WhichOneof('content') == 'raw_bytes':
+            try:
+                content = content_msg.raw_bytes.decode('utf-8')
+            except UnicodeDecodeError as e:
+                logger.error(f"Failed to decode raw content: {e}")
+                content = "Content decoding failed"
+            if content:
+                return content[:max_chars]
+        
+        # Priority 2: If no raw content, extract from Vertex AI's processed fields
+        if not derived_fields:
+            return ''
+        
+        # Extract from extractive_segments (most complete), then ALSO extractive_answers
+        # (contains specific information like golf benefits). Texts are decoded lazily, so
+        # once the cap is reached the remaining entries are never read.
+        texts = (
+            fields['content'].string_value
+            for key in ('extractive_segments', 'extractive_answers') if key in derived_fields
+            for fields in cls._extractive_fields(derived_fields, key)
+            if 'content' in fields
+        )
+        # An insertion-ordered dict keeps the first occurrence of each text, so
+        # duplicates are dropped in O(1) each
+        all_content_parts = {}
+        joined_length = -2  # no separator before the first part
+        for text in texts:
+            if text in all_content_parts:
+                continue
+            all_content_parts[text] = None
+            joined_length += len(text) + 2
+            if max_chars is not None and joined_length >= max_chars:
+                break
+        
+        # Combine all content parts, trimming the last one to fit
+        return '\n\n'.join(all_content_parts)[:max_chars]
+
+    @staticmethod
+    def _extractive_fields(derived_fields, key: str):
+        """Yield the struct fields of each entry in a derived extractive_* list."""
+        return (entry.struct_value.fields for entry in derived_fields[key].list_value.values)
+
     def _fallback_response(self, query: str) -> List[Dict]:
         """Provides a fallback response on API failure."""
         logger.warning(f"Using fallback response for query: {query}")
@@ -49,6 +49,7 @@ CREATE TABLE IF NOT EXISTS query_logs (
     query_mode VARCHAR(100),
     card_filter VARCHAR(255),
     top_k INTEGER,
+    is_comparison BOOLEAN DEFAULT FALSE,
     response_status INTEGER DEFAULT 0,
     execution_time_ms INTEGER,
     llm_tokens_used INTEGER,
@@ -59,6 +60,7 @@ CREATE TABLE IF NOT EXISTS query_logs (
     retention_expires_at TIMESTAMP WITH TIME ZONE,
     is_anonymized BOOLEAN DEFAULT FALSE,
     is_exported BOOLEAN DEFAULT FALSE,
+    export_id VARCHAR(255),
     query_metadata JSONB,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
@@ -86,8 +88,8 @@ CREATE TABLE IF NOT EXISTS daily_query_stats (
     general_queries INTEGER DEFAULT 0,
     specific_card_queries INTEGER DEFAULT 0,
     comparison_queries INTEGER DEFAULT 0,
-    avg_execution_time_ms DECIMAL(10, 2),
-    avg_tokens_used DECIMAL(10, 2),
+    sum_execution_time_ms BIGINT DEFAULT 0,
+    sum_tokens_used BIGINT DEFAULT 0,
     total_cost DECIMAL(10, 6) DEFAULT 0,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
@@ -97,10 +99,13 @@ CREATE INDEX IF NOT EXISTS idx_user_preferences_user_id ON user_preferences(user
 CREATE INDEX IF NOT EXISTS idx_session_preferences_expires ON session_preferences(expires_at);
 CREATE INDEX IF NOT EXISTS idx_user_query_counts_user_id ON user_query_counts(user_id);
 CREATE INDEX IF NOT EXISTS idx_user_query_counts_reset_date ON user_query_counts(last_reset_date);
-CREATE INDEX IF NOT EXISTS idx_query_logs_user_id ON query_logs(user_id);
+CREATE INDEX IF NOT EXISTS idx_query_logs_user_created ON query_logs(user_id, created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_query_logs_session_id ON query_logs(session_id);
 CREATE INDEX IF NOT EXISTS idx_query_logs_created_at ON query_logs(created_at);
 CREATE INDEX IF NOT EXISTS idx_query_logs_retention ON query_logs(retention_expires_at);
+CREATE INDEX IF NOT EXISTS idx_query_logs_anonymize ON query_logs(created_at) WHERE is_anonymized = FALSE;
+CREATE INDEX IF NOT EXISTS idx_query_logs_comparison ON query_logs(created_at) WHERE is_comparison;
+CREATE INDEX IF NOT EXISTS idx_query_logs_export ON query_logs(is_anonymized, response_status, created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_analytics_events_type ON analytics_events(event_type);
 CREATE INDEX IF NOT EXISTS idx_analytics_events_created_at ON analytics_events(created_at);
 CREATE INDEX IF NOT EXISTS idx_daily_query_stats_date ON daily_query_stats(date);
@@ -123,6 +128,256 @@ CREATE TRIGGER update_user_query_counts_updated_at
     BEFORE UPDATE ON user_query_counts 
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Increment a user's daily query count in one statement, resetting it on the first
+-- query of a new (UTC) day, and return the new count
+CREATE OR REPLACE FUNCTION increment_query_count(p_user_id TEXT, p_email TEXT DEFAULT NULL)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    today DATE := (NOW() AT TIME ZONE 'UTC')::DATE;
+    new_count INTEGER;
+BEGIN
+    INSERT INTO user_query_counts AS c (user_id, user_email, query_count, last_reset_date, updated_at)
+    VALUES (p_user_id, p_email, 1, today, NOW())
+    ON CONFLICT (user_id) DO UPDATE SET
+        query_count = CASE WHEN c.last_reset_date < today THEN 1 ELSE c.query_count + 1 END,
+        last_reset_date = today,
+        user_email = COALESCE(EXCLUDED.user_email, c.user_email),
+        updated_at = NOW()
+    RETURNING query_count INTO new_count;
+
+    RETURN new_count;
+END;
+$$;
+
+-- Mark exported query logs with the same predicate the export used, so the
+-- request stays constant-size no matter how many rows were exported
+CREATE OR REPLACE FUNCTION mark_exported(
+    p_export_id TEXT,
+    p_snapshot_at TIMESTAMPTZ,
+    p_start TIMESTAMPTZ DEFAULT NULL,
+    p_end TIMESTAMPTZ DEFAULT NULL,
+    p_only_anon BOOLEAN DEFAULT FALSE,
+    p_include_failed BOOLEAN DEFAULT TRUE
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    updated_count INTEGER;
+BEGIN
+    UPDATE query_logs
+    SET is_exported = TRUE,
+        export_id = p_export_id
+    WHERE created_at <= p_snapshot_at
+      AND (p_start IS NULL OR created_at >= p_start)
+      AND (p_end IS NULL OR created_at < p_end)
+      AND (NOT p_only_anon OR is_anonymized)
+      AND (p_include_failed OR response_status = 200);
+
+    GET DIAGNOSTICS updated_count = ROW_COUNT;
+    RETURN updated_count;
+END;
+$$;
+
+-- Apply a batch of logged responses in one round trip: one primary-key UPDATE of
+-- query_logs joined against the JSON rows (rows without an id fall back to
+-- matching on session_id), then one upsert adding the batch's daily stats
+-- counters, which QueryLogger pre-aggregates client-side.
+CREATE OR REPLACE FUNCTION update_query_responses(p_date DATE, p_rows JSONB, p_stats JSONB DEFAULT NULL)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    updated_count INTEGER;
+    fallback_count INTEGER;
+BEGIN
+    UPDATE query_logs q
+    SET response_status = r.response_status,
+        execution_time_ms = r.execution_time_ms,
+        llm_tokens_used = r.llm_tokens_used,
+        llm_cost = r.llm_cost,
+        search_results_count = r.search_results_count
+    FROM jsonb_to_recordset(p_rows) AS r(
+        id UUID,
+        response_status INTEGER,
+        execution_time_ms INTEGER,
+        llm_tokens_used INTEGER,
+        llm_cost NUMERIC,
+        search_results_count INTEGER
+    )
+    WHERE q.id = r.id;
+
+    GET DIAGNOSTICS updated_count = ROW_COUNT;
+
+    UPDATE query_logs q
+    SET response_status = r.response_status,
+        execution_time_ms = r.execution_time_ms,
+        llm_tokens_used = r.llm_tokens_used,
+        llm_cost = r.llm_cost,
+        search_results_count = r.search_results_count
+    FROM jsonb_to_recordset(p_rows) AS r(
+        id UUID,
+        session_id TEXT,
+        response_status INTEGER,
+        execution_time_ms INTEGER,
+        llm_tokens_used INTEGER,
+        llm_cost NUMERIC,
+        search_results_count INTEGER
+    )
+    WHERE r.id IS NULL AND q.session_id = r.session_id;
+
+    GET DIAGNOSTICS fallback_count = ROW_COUNT;
+    updated_count := updated_count + fallback_count;
+
+    IF COALESCE((p_stats->>'total_queries')::INTEGER, 0) > 0 THEN
+        INSERT INTO daily_query_stats AS s (
+            date, total_queries, successful_queries, failed_queries,
+            gemini_flash_lite_queries, gemini_flash_queries, gemini_pro_queries,
+            general_queries, specific_card_queries, comparison_queries,
+            sum_execution_time_ms, sum_tokens_used, total_cost
+        ) VALUES (
+            p_date,
+            (p_stats->>'total_queries')::INTEGER,
+            COALESCE((p_stats->>'successful_queries')::INTEGER, 0),
+            COALESCE((p_stats->>'failed_queries')::INTEGER, 0),
+            COALESCE((p_stats->>'gemini_flash_lite_queries')::INTEGER, 0),
+            COALESCE((p_stats->>'gemini_flash_queries')::INTEGER, 0),
+            COALESCE((p_stats->>'gemini_pro_queries')::INTEGER, 0),
+            COALESCE((p_stats->>'general_queries')::INTEGER, 0),
+            COALESCE((p_stats->>'specific_card_queries')::INTEGER, 0),
+            COALESCE((p_stats->>'comparison_queries')::INTEGER, 0),
+            COALESCE((p_stats->>'sum_execution_time_ms')::BIGINT, 0),
+            COALESCE((p_stats->>'sum_tokens_used')::BIGINT, 0),
+            COALESCE((p_stats->>'total_cost')::NUMERIC, 0)
+        )
+        ON CONFLICT (date) DO UPDATE SET
+            total_queries = s.total_queries + EXCLUDED.total_queries,
+            successful_queries = s.successful_queries + EXCLUDED.successful_queries,
+            failed_queries = s.failed_queries + EXCLUDED.failed_queries,
+            gemini_flash_lite_queries = s.gemini_flash_lite_queries + EXCLUDED.gemini_flash_lite_queries,
+            gemini_flash_queries = s.gemini_flash_queries + EXCLUDED.gemini_flash_queries,
+            gemini_pro_queries = s.gemini_pro_queries + EXCLUDED.gemini_pro_queries,
+            general_queries = s.general_queries + EXCLUDED.general_queries,
+            specific_card_queries = s.specific_card_queries + EXCLUDED.specific_card_queries,
+            comparison_queries = s.comparison_queries + EXCLUDED.comparison_queries,
+            sum_execution_time_ms = s.sum_execution_time_ms + EXCLUDED.sum_execution_time_ms,
+            sum_tokens_used = s.sum_tokens_used + EXCLUDED.sum_tokens_used,
+            total_cost = s.total_cost + EXCLUDED.total_cost;
+    END IF;
+
+    RETURN updated_count;
+END;
+$$;
+
+-- Recompute daily_query_stats from query_logs for every UTC date from p_start through
+-- today in one statement, overwriting all counters. Dates without answered queries
+-- are written as zeros, so stale counts don't survive a rebuild. The table lock makes
+-- concurrent update_query_responses increments (and other rebuilds) wait until this
+-- one commits instead of being overwritten by it.
+CREATE OR REPLACE FUNCTION rebuild_daily_stats(p_start DATE)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    rebuilt_count INTEGER;
+BEGIN
+    LOCK TABLE daily_query_stats IN SHARE ROW EXCLUSIVE MODE;
+
+    INSERT INTO daily_query_stats AS s (
+        date, total_queries, successful_queries, failed_queries,
+        gemini_flash_lite_queries, gemini_flash_queries, gemini_pro_queries,
+        general_queries, specific_card_queries, comparison_queries,
+        sum_execution_time_ms, sum_tokens_used, total_cost
+    )
+    SELECT
+        d.day::DATE,
+        COUNT(q.id),
+        COUNT(q.id) FILTER (WHERE q.response_status = 200),
+        COUNT(q.id) FILTER (WHERE q.response_status <> 200),
+        COUNT(q.id) FILTER (WHERE q.selected_model = 'gemini-2.5-flash-lite'),
+        COUNT(q.id) FILTER (WHERE q.selected_model = 'gemini-1.5-flash'),
+        COUNT(q.id) FILTER (WHERE q.selected_model = 'gemini-1.5-pro'),
+        COUNT(q.id) FILTER (WHERE q.query_mode = 'General Query'),
+        COUNT(q.id) FILTER (WHERE q.query_mode = 'Specific Card'),
+        COUNT(q.id) FILTER (WHERE q.is_comparison),
+        COALESCE(SUM(q.execution_time_ms) FILTER (WHERE q.response_status = 200), 0),
+        COALESCE(SUM(q.llm_tokens_used) FILTER (WHERE q.response_status = 200), 0),
+        COALESCE(SUM(q.llm_cost), 0)
+    FROM generate_series(
+        p_start::TIMESTAMP, (NOW() AT TIME ZONE 'UTC')::DATE::TIMESTAMP, INTERVAL '1 day'
+    ) AS d(day)
+    -- response_status 0 means no response was logged
+    LEFT JOIN query_logs q
+        ON q.created_at >= d.day AT TIME ZONE 'UTC'
+       AND q.created_at < (d.day + INTERVAL '1 day') AT TIME ZONE 'UTC'
+       AND q.response_status <> 0
+    GROUP BY d.day
+    ON CONFLICT (date) DO UPDATE SET
+        total_queries = EXCLUDED.total_queries,
+        successful_queries = EXCLUDED.successful_queries,
+        failed_queries = EXCLUDED.failed_queries,
+        gemini_flash_lite_queries = EXCLUDED.gemini_flash_lite_queries,
+        gemini_flash_queries = EXCLUDED.gemini_flash_queries,
+        gemini_pro_queries = EXCLUDED.gemini_pro_queries,
+        general_queries = EXCLUDED.general_queries,
+        specific_card_queries = EXCLUDED.specific_card_queries,
+        comparison_queries = EXCLUDED.comparison_queries,
+        sum_execution_time_ms = EXCLUDED.sum_execution_time_ms,
+        sum_tokens_used = EXCLUDED.sum_tokens_used,
+        total_cost = EXCLUDED.total_cost;
+
+    GET DIAGNOSTICS rebuilt_count = ROW_COUNT;
+    RETURN rebuilt_count;
+END;
+$$;
+
+-- GDPR cleanup in one transaction: delete expired query logs, anonymize those older
+-- than p_anonymize_after days, and return only the two row counts
+CREATE OR REPLACE FUNCTION gdpr_cleanup(p_anonymize_after INTEGER)
+RETURNS TABLE(deleted INTEGER, anonymized INTEGER)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM query_logs
+    WHERE retention_expires_at < NOW();
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+
+    UPDATE query_logs
+    SET query_text = '[ANONYMIZED]',
+        enhanced_query = '[ANONYMIZED]',
+        user_ip_hash = NULL,
+        user_agent_hash = NULL,
+        is_anonymized = TRUE
+    WHERE created_at < NOW() - make_interval(days => p_anonymize_after)
+      AND is_anonymized = FALSE
+      AND retention_expires_at > NOW();
+    GET DIAGNOSTICS anonymized = ROW_COUNT;
+
+    RETURN NEXT;
+END;
+$$;
+
+-- Daily stats with averages computed on read from the running sums
+CREATE OR REPLACE VIEW daily_query_stats_view AS
+SELECT
+    date,
+    total_queries,
+    successful_queries,
+    failed_queries,
+    gemini_flash_lite_queries,
+    gemini_flash_queries,
+    gemini_pro_queries,
+    general_queries,
+    specific_card_queries,
+    comparison_queries,
+    ROUND(sum_execution_time_ms::NUMERIC / NULLIF(successful_queries, 0), 2) AS avg_execution_time_ms,
+    ROUND(sum_tokens_used::NUMERIC / NULLIF(successful_queries, 0), 2) AS avg_tokens_used,
+    total_cost,
+    created_at
+FROM daily_query_stats;
+
 -- Row Level Security (RLS) Policies
 -- Enable RLS on all tables
 ALTER TABLE user_preferences ENABLE ROW LEVEL SECURITY;
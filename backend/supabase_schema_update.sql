@@ -16,6 +16,7 @@ CREATE TABLE query_logs (
     query_mode VARCHAR(100),
     card_filter VARCHAR(255),
     top_k INTEGER,
+    is_comparison BOOLEAN DEFAULT FALSE,
     response_status INTEGER DEFAULT 0,
     execution_time_ms INTEGER,
     llm_tokens_used INTEGER,
@@ -26,6 +27,7 @@ CREATE TABLE query_logs (
     retention_expires_at TIMESTAMP WITH TIME ZONE,
     is_anonymized BOOLEAN DEFAULT FALSE,
     is_exported BOOLEAN DEFAULT FALSE,
+    export_id VARCHAR(255),
     query_metadata JSONB,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
@@ -43,16 +45,37 @@ CREATE TABLE daily_query_stats (
     general_queries INTEGER DEFAULT 0,
     specific_card_queries INTEGER DEFAULT 0,
     comparison_queries INTEGER DEFAULT 0,
-    avg_execution_time_ms DECIMAL(10, 2),
-    avg_tokens_used DECIMAL(10, 2),
+    sum_execution_time_ms BIGINT DEFAULT 0,
+    sum_tokens_used BIGINT DEFAULT 0,
     total_cost DECIMAL(10, 6) DEFAULT 0,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Daily stats with averages computed on read from the running sums
+-- (recreated here because dropping daily_query_stats CASCADE drops the view too)
+CREATE OR REPLACE VIEW daily_query_stats_view AS
+SELECT
+    date,
+    total_queries,
+    successful_queries,
+    failed_queries,
+    gemini_flash_lite_queries,
+    gemini_flash_queries,
+    gemini_pro_queries,
+    general_queries,
+    specific_card_queries,
+    comparison_queries,
+    ROUND(sum_execution_time_ms::NUMERIC / NULLIF(successful_queries, 0), 2) AS avg_execution_time_ms,
+    ROUND(sum_tokens_used::NUMERIC / NULLIF(successful_queries, 0), 2) AS avg_tokens_used,
+    total_cost,
+    created_at
+FROM daily_query_stats;
+
 -- Create indexes for performance
 CREATE INDEX IF NOT EXISTS idx_query_logs_session_id ON query_logs(session_id);
 CREATE INDEX IF NOT EXISTS idx_query_logs_created_at ON query_logs(created_at);
 CREATE INDEX IF NOT EXISTS idx_query_logs_retention ON query_logs(retention_expires_at);
+CREATE INDEX IF NOT EXISTS idx_query_logs_comparison ON query_logs(created_at) WHERE is_comparison;
 CREATE INDEX IF NOT EXISTS idx_daily_query_stats_date ON daily_query_stats(date);
 
 -- Enable Row Level Security
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Tests for QueryLogger's background log writer
+Uses an in-memory fake in place of Supabase, so no database is needed
+"""
+
+import asyncio
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import services.query_logger as query_logger
+from services.query_logger import QueryLogger
+from logging_models.logging_models import LoggingConfig, QueryLogData, ResponseLogData
+
+
+class FakeRPC:
+    """Records the RPC call when it is executed and returns the canned result"""
+
+    def __init__(self, calls, name, params, data):
+        self.calls = calls
+        self.name = name
+        self.params = params
+        self.data = data
+
+    def execute(self):
+        self.calls.append((self.name, self.params))
+        return SimpleNamespace(data=self.data)
+
+
+class FakeClient:
+    def __init__(self):
+        self.rpc_calls = []
+        self.rpc_results = {}
+
+    def rpc(self, name, params):
+        return FakeRPC(self.rpc_calls, name, params, self.rpc_results.get(name))
+
+
+class FakeDB:
+    """Stands in for SupabaseService: keeps every bulk insert and RPC call"""
+
+    def __init__(self):
+        self.client = FakeClient()
+        self.inserts = []
+
+    def log_queries_batch(self, rows):
+        self.inserts.append(list(rows))
+
+    @property
+    def inserted_rows(self):
+        return [row for batch in self.inserts for row in batch]
+
+
+def make_logger(db):
+    return QueryLogger(LoggingConfig(hash_salt="test-salt"), db)
+
+
+def query(session_id, text="What is the lounge access on Atlas?",
+          model="gemini-1.5-flash", mode="General Query"):
+    return QueryLogData(query_text=text, selected_model=model, query_mode=mode, session_id=session_id)
+
+
+def test_query_and_response_merge_into_one_insert():
+    async def run():
+        db = FakeDB()
+        ql = make_logger(db)
+        await ql.log_query(query("s1"))
+        await ql.log_response("s1", ResponseLogData(
+            response_status=200, execution_time_ms=1200, llm_tokens_used=300,
+            llm_cost=0.25, search_results_count=7
+        ))
+        await ql.shutdown()
+        return db
+
+    db = asyncio.run(run())
+
+    assert len(db.inserts) == 1
+    [row] = db.inserted_rows
+    assert row['session_id'] == 's1'
+    assert row['response_status'] == 200
+    assert row['execution_time_ms'] == 1200
+    assert row['llm_tokens_used'] == 300
+    assert row['search_results_count'] == 7
+    # The row was complete when inserted, so no response update was needed
+    [(name, params)] = db.client.rpc_calls
+    assert name == 'update_query_responses'
+    assert params['p_rows'] == []
+
+
+def test_unanswered_query_is_flushed_after_timeout(monkeypatch):
+    monkeypatch.setattr(query_logger, 'PENDING_TIMEOUT_SECONDS', 0.05)
+    monkeypatch.setattr(query_logger, 'PENDING_SWEEP_INTERVAL', 0.01)
+
+    async def run():
+        db = FakeDB()
+        ql = make_logger(db)
+        await ql.log_query(query("s1"))
+        queued_at = time.monotonic()
+
+        # Held while the response could still arrive
+        await asyncio.sleep(0.01)
+        await ql.flush()
+        assert db.inserts == []
+
+        # The sweeper writes it out once the timeout has passed
+        while not db.inserts and time.monotonic() - queued_at < 2:
+            await asyncio.sleep(0.02)
+            await ql.flush()
+        await ql.shutdown()
+        return db, ql
+
+    db, ql = asyncio.run(run())
+
+    [row] = db.inserted_rows
+    assert row['session_id'] == 's1'
+    assert row['response_status'] == 0
+    assert 'execution_time_ms' not in row
+    assert ql._pending == {}
+    # No response means no daily stats
+    assert db.client.rpc_calls == []
+
+
+def test_created_at_is_stamped_when_the_query_arrives(monkeypatch):
+    monkeypatch.setattr(query_logger, 'PENDING_TIMEOUT_SECONDS', 0.05)
+    monkeypatch.setattr(query_logger, 'PENDING_SWEEP_INTERVAL', 0.01)
+
+    async def run():
+        db = FakeDB()
+        ql = make_logger(db)
+        await ql.log_query(query("s1"))
+        row = ql._pending["s1"][0]
+        created_at = row['created_at']
+        await asyncio.sleep(0.15)
+        await ql.shutdown()
+        return db, created_at
+
+    db, created_at = asyncio.run(run())
+
+    [row] = db.inserted_rows
+    assert row['created_at'] == created_at
+    assert row['query_metadata']['logged_at'] > created_at
+
+
+def test_dropped_logs_counts_ops_rejected_by_a_full_queue(monkeypatch):
+    monkeypatch.setattr(query_logger, 'LOG_QUEUE_MAXSIZE', 2)
+
+    async def run():
+        db = FakeDB()
+        ql = make_logger(db)
+        # log_response never yields to the event loop, so the writer can't drain in between
+        for session_id in ("s1", "s2", "s3", "s4"):
+            await ql.log_response(session_id, ResponseLogData(response_status=200, execution_time_ms=10))
+        dropped = ql.dropped_logs
+        await ql.shutdown()
+        return db, dropped
+
+    db, dropped = asyncio.run(run())
+
+    assert dropped == 2
+    [(_, params)] = db.client.rpc_calls
+    assert [row['session_id'] for row in params['p_rows']] == ["s1", "s2"]
+
+
+def test_shutdown_writes_held_and_queued_ops():
+    async def run():
+        db = FakeDB()
+        ql = make_logger(db)
+        for i in range(5):
+            await ql.log_query(query(f"s{i}"))
+        await ql.log_response("s0", ResponseLogData(response_status=200, execution_time_ms=10))
+
+        # Nothing has been written yet: s0 is queued, s1-s4 are still held
+        assert db.inserts == []
+        await ql.shutdown()
+        return db, ql
+
+    db, ql = asyncio.run(run())
+
+    rows = {row['session_id']: row for row in db.inserted_rows}
+    assert sorted(rows) == ["s0", "s1", "s2", "s3", "s4"]
+    assert rows["s0"]['response_status'] == 200
+    assert all(rows[f"s{i}"]['response_status'] == 0 for i in range(1, 5))
+    assert ql._pending == {}
+    assert ql._log_queue.empty()
+    assert ql._log_task is None and ql._sweep_task is None
+
+
+def test_mixed_batch_sends_exact_update_query_responses_params():
+    async def run():
+        db = FakeDB()
+        ql = make_logger(db)
+
+        # s2's query is written unanswered first, so its response becomes an update
+        await ql.log_query(query("s2", model="gemini-2.5-flash-lite", mode="Specific Card"))
+        ql._release_pending(time.monotonic())
+        await ql.flush()
+
+        await ql.log_query(query("s1", text="Compare Infinia and Atlas lounge access"))
+        await ql.log_query(query("s3", model="gemini-1.5-pro"))
+        await ql.log_response("s1", ResponseLogData(
+            response_status=200, execution_time_ms=1000, llm_tokens_used=300,
+            llm_cost=0.25, search_results_count=7
+        ))
+        await ql.log_response("s2", ResponseLogData(
+            response_status=200, execution_time_ms=500, llm_tokens_used=100,
+            llm_cost=0.5, search_results_count=3
+        ))
+        await ql.log_response("s3", ResponseLogData(response_status=500, execution_time_ms=50))
+        await ql.flush()
+        await ql.shutdown()
+        return db
+
+    db = asyncio.run(run())
+
+    first_insert, second_insert = db.inserts
+    [s2_row] = first_insert
+    assert [row['session_id'] for row in second_insert] == ["s1", "s3"]
+
+    [(name, params)] = db.client.rpc_calls
+    assert name == 'update_query_responses'
+    assert params == {
+        'p_date': s2_row['created_at'][:10],
+        'p_rows': [{
+            'id': s2_row['id'],
+            'session_id': 's2',
+            'response_status': 200,
+            'execution_time_ms': 500,
+            'llm_tokens_used': 100,
+            'llm_cost': 0.5,
+            'search_results_count': 3
+        }],
+        'p_stats': {
+            'total_queries': 3,
+            'successful_queries': 2,
+            'failed_queries': 1,
+            'gemini_flash_queries': 1,
+            'gemini_flash_lite_queries': 1,
+            'gemini_pro_queries': 1,
+            'general_queries': 2,
+            'specific_card_queries': 1,
+            'comparison_queries': 1,
+            'sum_execution_time_ms': 1500,
+            'sum_tokens_used': 400,
+            'total_cost': 0.75
+        }
+    }
+
+
+def test_rebuild_daily_stats_runs_server_side():
+    db = FakeDB()
+    db.client.rpc_results['rebuild_daily_stats'] = 8
+    ql = make_logger(db)
+
+    assert asyncio.run(ql.rebuild_daily_stats(days=7)) == 8
+
+    [(name, params)] = db.client.rpc_calls
+    assert name == 'rebuild_daily_stats'
+    start = date.fromisoformat(params['p_start'])
+    assert timedelta(days=6) <= date.today() - start <= timedelta(days=8)
+    assert db.inserts == []
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Tests for VertexRetriever's search cache and single-flight coalescing
+Uses a stub search client that counts calls, so no Google Cloud access is needed
+"""
+
+import asyncio
+import time
+
+import numpy as np
+import pytest
+from google.api_core import exceptions as google_exceptions
+from google.cloud import discoveryengine
+
+import services.vertex_retriever as vertex_retriever
+from services.vertex_retriever import VertexRetriever, _SemanticCache
+
+
+def search_response(query: str) -> discoveryengine.SearchResponse:
+    """A one-result SearchResponse whose content echoes the query"""
+    document = discoveryengine.Document(
+        struct_data={'cardName': 'Axis Atlas', 'section': 'lounge'},
+        content=discoveryengine.Document.Content(mime_type='text/plain', raw_bytes=f"Results for {query}".encode())
+    )
+    return discoveryengine.SearchResponse(results=[discoveryengine.SearchResponse.SearchResult(document=document)])
+
+
+class StubSearchClient:
+    """Stands in for the shared sync client, which only builds the serving config path"""
+    serving_config_path = staticmethod(discoveryengine.SearchServiceClient.serving_config_path)
+
+
+class StubAsyncSearchClient:
+    """Async search client: counts calls, can hold them open until `release` and fail with `error`"""
+
+    def __init__(self):
+        self.calls = 0
+        self.closed = 0
+        self.release = asyncio.Event()
+        self.release.set()
+        self.error = None
+        self.transport = self
+
+    async def search(self, request):
+        self.calls += 1
+        await self.release.wait()
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
+        return search_response(request.query)
+
+    async def close(self):
+        self.closed += 1
+
+
+class TopicEmbedding:
+    """Embedding model stub that only sees a few topic words, so queries about the same
+    topic embed identically whichever card they name"""
+    TOPICS = ('lounge', 'golf', 'fee')
+
+    def embed(self, texts):
+        for text in texts:
+            yield np.array([float(topic in text.lower()) for topic in self.TOPICS] + [0.1])
+
+
+@pytest.fixture
+def retriever(monkeypatch):
+    monkeypatch.setattr(VertexRetriever, '_get_search_client', lambda self: (StubSearchClient(), None))
+    monkeypatch.setattr(VertexRetriever, '_init_semantic_cache', lambda self: None)
+    retriever = VertexRetriever('test-project', 'global', 'test-store')
+    client = StubAsyncSearchClient()
+    monkeypatch.setattr(retriever, '_create_async_client', lambda: client)
+    return retriever
+
+
+def search(retriever, query_text, **kwargs):
+    return asyncio.run(retriever.asearch_similar_documents(query_text, **kwargs))
+
+
+def test_concurrent_searches_share_one_rpc(retriever):
+    client = retriever._create_async_client()
+
+    async def run():
+        client.release.clear()
+        searches = asyncio.gather(*[retriever.asearch_similar_documents("lounge access") for _ in range(5)])
+        await asyncio.sleep(0.01)
+        client.release.set()
+        return await searches
+
+    results = asyncio.run(run())
+
+    assert client.calls == 1
+    assert all(docs[0]['content'] == "Results for lounge access" for docs in results)
+    # Every caller gets its own copies
+    assert len({id(docs[0]) for docs in results}) == 5
+    assert retriever._ainflight == {}
+
+
+def test_leader_error_propagates_and_waiters_search_again(retriever):
+    client = retriever._create_async_client()
+
+    async def run():
+        client.release.clear()
+        client.error = RuntimeError("boom")
+        searches = asyncio.gather(
+            *[retriever.asearch_similar_documents("lounge access") for _ in range(4)],
+            return_exceptions=True
+        )
+        await asyncio.sleep(0.01)
+        client.release.set()
+        return await searches
+
+    leader_result, *results = asyncio.run(run())
+
+    assert isinstance(leader_result, RuntimeError)
+    # Waiters don't hang or inherit the failure; each searches on its own
+    assert all(docs[0]['content'] == "Results for lounge access" for docs in results)
+    assert client.calls == 4
+    assert retriever._ainflight == {}
+
+
+def test_api_error_fallback_is_not_cached(retriever):
+    client = retriever._create_async_client()
+    client.error = google_exceptions.ServiceUnavailable("unavailable")
+
+    [fallback] = search(retriever, "lounge access")
+    assert fallback['cardName'] == "System"
+
+    [doc] = search(retriever, "lounge access")
+    assert doc['content'] == "Results for lounge access"
+    assert client.calls == 2
+
+
+def test_cached_results_expire_after_ttl(retriever, monkeypatch):
+    monkeypatch.setattr(vertex_retriever, 'SEARCH_CACHE_TTL_SECONDS', 0.05)
+    client = retriever._create_async_client()
+
+    search(retriever, "lounge access")
+    search(retriever, "lounge access")
+    assert client.calls == 1
+
+    time.sleep(0.1)
+    search(retriever, "lounge access")
+    assert client.calls == 2
+
+
+def test_cache_evicts_least_recently_used(retriever, monkeypatch):
+    monkeypatch.setattr(vertex_retriever, 'SEARCH_CACHE_MAXSIZE', 2)
+    client = retriever._create_async_client()
+
+    search(retriever, "a")
+    search(retriever, "b")
+    search(retriever, "a")  # hit: "b" is now least recently used
+    search(retriever, "c")
+    assert client.calls == 3
+
+    search(retriever, "a")
+    assert client.calls == 3
+    search(retriever, "b")
+    assert client.calls == 4
+
+
+def test_cache_keys_include_card_filter_and_top_k(retriever):
+    client = retriever._create_async_client()
+
+    search(retriever, "lounge access")
+    search(retriever, "lounge access", card_filter="Axis Atlas")
+    search(retriever, "lounge access", top_k=5)
+    assert client.calls == 3
+
+
+def test_semantic_cache_hits_are_scoped_to_the_cards_a_query_names(retriever):
+    client = retriever._create_async_client()
+    retriever._semantic_cache = _SemanticCache(TopicEmbedding(), 16, 0.92, 300)
+
+    [infinia] = search(retriever, "HDFC Infinia lounge access")
+    [atlas] = search(retriever, "Axis Atlas lounge access")
+    assert client.calls == 2
+    assert atlas['content'] == "Results for Axis Atlas lounge access"
+
+    # A paraphrase naming the same card (by an alias) reuses the earlier results
+    [paraphrase] = search(retriever, "What lounge access does Infinia give?")
+    assert client.calls == 2
+    assert paraphrase['content'] == infinia['content']
+
+    # So does one naming no card, but only against another query naming none
+    search(retriever, "lounge access")
+    search(retriever, "Tell me about lounge access")
+    assert client.calls == 3
+
+
+def test_content_is_only_capped_when_asked(retriever):
+    client = retriever._create_async_client()
+    query = "lounge access " * 10
+
+    [full] = search(retriever, query)
+    [capped] = search(retriever, query, max_content_chars=20)
+    assert full['content'] == f"Results for {query}"
+    assert capped['content'] == full['content'][:20]
+    # Capped and full results are cached separately
+    assert client.calls == 2
+    [full_again] = search(retriever, query)
+    assert full_again['content'] == full['content']
+    assert client.calls == 2
+
+
+def test_sync_search_runs_on_its_own_loop_and_closes_its_client(retriever):
+    client = retriever._create_async_client()
+
+    [doc] = retriever.search_similar_documents("lounge access")
+    assert doc['content'] == "Results for lounge access"
+    assert client.closed == 1
+    assert retriever._async_clients == {} and retriever._search_semaphores == {}
+
+    # Shares the cache with the async API
+    search(retriever, "lounge access")
+    assert client.calls == 1
+
+
+def test_sync_search_refuses_to_run_inside_an_event_loop(retriever):
+    async def run():
+        with pytest.raises(RuntimeError, match="asearch_similar_documents"):
+            retriever.search_similar_documents("lounge access")
+
+    asyncio.run(run())
+    assert retriever._create_async_client().calls == 0
+
+
+def test_search_many_runs_searches_concurrently_in_order(retriever):
+    client = retriever._create_async_client()
+
+    async def run():
+        client.release.clear()
+        searches = asyncio.ensure_future(retriever.search_many(
+            [("lounge access", None), ("golf", "Axis Atlas"), ("lounge access", None)]
+        ))
+        await asyncio.sleep(0.01)
+        # All distinct searches are in flight at once; the duplicate joins the first
+        assert client.calls == 2
+        client.release.set()
+        return await searches
+
+    lounge, golf, lounge_again = asyncio.run(run())
+
+    assert lounge[0]['content'] == lounge_again[0]['content'] == "Results for lounge access"
+    assert golf[0]['content'] == "Results for Axis Atlas golf"
+    assert client.calls == 2
+
+
+def test_search_batch_runs_search_many_without_a_loop(retriever):
+    client = retriever._create_async_client()
+
+    results = retriever.search_batch([("lounge access", None), ("golf", "Axis Atlas")], top_k=5)
+
+    assert [docs[0]['content'] for docs in results] == ["Results for lounge access", "Results for Axis Atlas golf"]
+    assert client.calls == 2
+    assert client.closed == 1
+
+    async def run():
+        with pytest.raises(RuntimeError, match="search_many"):
+            retriever.search_batch([("lounge access", None)])
+
+    asyncio.run(run())
+
+
+def test_cards_mentioned_lists_display_names_in_order(retriever):
+    assert retriever.cards_mentioned("Compare Infinia with Axis Atlas and HDFC Infinia") == ["HDFC Infinia", "Axis Atlas"]
+    assert retriever.cards_mentioned("lounge access") == []
+
+
+def test_search_cards_runs_one_filtered_search_per_card(retriever):
+    client = retriever._create_async_client()
+
+    async def run():
+        client.release.clear()
+        searches = asyncio.ensure_future(retriever.search_cards("lounge access", ["HDFC Infinia", "Axis Atlas"]))
+        await asyncio.sleep(0.01)
+        assert client.calls == 2
+        client.release.set()
+        return await searches
+
+    infinia, atlas = asyncio.run(run())
+
+    assert infinia[0]['content'] == "Results for HDFC Infinia lounge access"
+    assert atlas[0]['content'] == "Results for Axis Atlas lounge access"
+
+
+def test_partial_card_matches_are_memoized_with_a_bound(retriever):
+    assert retriever._partial_card_match("Atlas Rewards Card") == "Axis Atlas"
+    assert retriever._partial_card_match("Unknown Bank Card") is None
+    assert retriever._partial_card_match("Unknown Bank Card") is None
+    assert retriever._partial_card_match("Atlas Rewards Card") == "Axis Atlas"
+
+    info = retriever._partial_card_match.cache_info()
+    assert (info.hits, info.misses) == (2, 2)
+    assert info.maxsize == vertex_retriever.PARTIAL_MATCH_CACHE_SIZE
+
+
+def test_credential_failures_are_not_cached(monkeypatch):
+    credentials = object()
+    outcomes = [google_exceptions.GoogleAPIError("metadata server unreachable"), (credentials, 'test-project')]
+    calls = []
+
+    def default():
+        calls.append(None)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(vertex_retriever, 'default', default)
+    vertex_retriever._load_credentials.cache_clear()
+    try:
+        with pytest.raises(google_exceptions.GoogleAPIError):
+            vertex_retriever._load_credentials(None, None)
+        assert vertex_retriever._load_credentials(None, None) is credentials
+        assert vertex_retriever._load_credentials(None, None) is credentials
+        assert len(calls) == 2
+    finally:
+        vertex_retriever._load_credentials.cache_clear()
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))